@@ -1,6 +1,12 @@
-from requisicoes.models import Order
+from requisicoes.pending import pending_count
+
 
 def pending_orders(request):
-    if request.user.is_authenticated and request.user.is_staff:
-        return {"pending_orders": Order.objects.filter(is_read=False).count()}
-    return {"pending_orders": 0}
+    """
+    Badge de pedidos pendentes (filial destino). É um callable: o template
+    só chama (e só consulta o cache/banco) se realmente usar a variável.
+    """
+    branch = getattr(request, "branch", None)
+    if branch is None or not branch.is_austin:
+        return {"pending_orders": 0}
+    return {"pending_orders": lambda: pending_count(branch.location_id)}
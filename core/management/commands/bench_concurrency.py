@@ -0,0 +1,156 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.management.commands.run_benchmark import _git_commit, percentile
+from core.management.commands.seed_benchmark import bench_username
+from requisicoes.branch import AUSTIN, QUEIMADOS
+
+
+def session_cookie_for(user):
+    """
+    Cria uma sessão autenticada direto no session store (mesmo banco/cache
+    do servidor) — dispensa senha e o POST do login.
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga contra um servidor rodando (--url): N usuários de "
+        "filial simultâneos batendo nas listagens por --duration segundos, "
+        "pra cada nível de --concurrency. Compare o mesmo seed com "
+        "SERVER_MODE=wsgi e SERVER_MODE=asgi (1 worker cada). "
+        "Rode depois do seed_benchmark, apontando pro mesmo banco do servidor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", default="1,5,10,25,50",
+                            help="Níveis de usuários simultâneos, separados por vírgula")
+        parser.add_argument("--duration", type=float, default=10.0, help="Segundos por nível")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Timeout de cada request")
+        parser.add_argument("--label", default="", help="Identifica a rodada no JSON (ex.: wsgi, asgi)")
+        parser.add_argument("--json", dest="json_path", help="Salva o resultado em JSON")
+
+    def handle(self, *args, **opts):
+        try:
+            levels = [int(v) for v in opts["concurrency"].split(",") if v.strip()]
+        except ValueError:
+            raise CommandError("--concurrency deve ser uma lista de inteiros (ex.: 1,10,50).")
+        if not levels or min(levels) < 1:
+            raise CommandError("--concurrency precisa de pelo menos um nível >= 1.")
+
+        try:
+            queimados = User.objects.get(username=bench_username(QUEIMADOS))
+            austin = User.objects.get(username=bench_username(AUSTIN))
+        except User.DoesNotExist:
+            raise CommandError("Usuários de benchmark não existem: rode seed_benchmark antes.")
+
+        base = opts["url"].rstrip("/")
+        # metade dos usuários simula Queimados (catálogo + meus pedidos),
+        # metade Austin (painel)
+        self.profiles = [
+            (session_cookie_for(queimados), [
+                reverse("requisition_list"),
+                reverse("user_orders"),
+            ]),
+            (session_cookie_for(austin), [
+                reverse("admin_home"),
+            ]),
+        ]
+        self.base = base
+        self.timeout = opts["timeout"]
+
+        self._get(self.profiles[0][0], self.profiles[0][1][0])  # aquece / valida
+
+        results = []
+        for level in levels:
+            result = self._run_level(level, opts["duration"])
+            results.append(result)
+            self.stdout.write(
+                f"{level:>5} usuários  {result['rps']:>8.1f} req/s  "
+                f"p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                f"erros {result['errors']}"
+            )
+
+        if opts["json_path"]:
+            report = {
+                "label": opts["label"],
+                "url": base,
+                "commit": _git_commit(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "duration": opts["duration"],
+                "levels": results,
+            }
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2, ensure_ascii=False)
+            self.stdout.write(f"JSON salvo em {opts['json_path']}")
+
+    # --------------------------------------------------
+    def _get(self, cookie, path):
+        req = urllib.request.Request(self.base + path, headers={"Cookie": cookie})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as exc:
+            raise CommandError(f"{path}: status {exc.code}")
+        except (urllib.error.URLError, OSError) as exc:
+            raise CommandError(f"{self.base}{path}: {exc}")
+
+    def _run_level(self, users, duration):
+        timings = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def user_loop(n):
+            cookie, paths = self.profiles[n % len(self.profiles)]
+            i = n
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    self._get(cookie, path)
+                except CommandError as exc:
+                    with lock:
+                        errors.append(str(exc))
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            list(pool.map(user_loop, range(users)))
+        wall = time.monotonic() - started
+
+        return {
+            "users": users,
+            "requests": len(timings),
+            "rps": round(len(timings) / wall, 1) if wall else 0.0,
+            "p50_ms": round(statistics.median(timings), 1) if timings else 0.0,
+            "p95_ms": round(percentile(timings, 95), 1),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+        }
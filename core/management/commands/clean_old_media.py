@@ -1,29 +1,206 @@
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand
-from requisicoes.models import Requisition, Product
+from django.db import models, transaction
+from django.db.models import Q
+
+from requisicoes.catalog import invalidate_catalog
+from requisicoes.media_urls import refresh_media_urls
+from requisicoes.models import Requisition
+from requisicoes.thumbnails import THUMBNAIL_ROOT, refresh_thumbnails, thumbnail_names
+
+
+# referências da época do /media/ local, antes do Cloudinary
+DEFAULT_STALE_PREFIXES = ("icons/", "products/")
+
+
+def file_fields():
+    """
+    (model, campo) de todo FileField/ImageField dos apps instalados.
+    """
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def _label(model, field):
+    return f"{model._meta.label}.{field.name}"
+
+
+def _storage_name(storage, name):
+    # MediaCloudinaryStorage grava e lista tudo sob PREFIX (padrão: MEDIA_URL,
+    # "media/"); nomes antigos no banco podem estar sem ele
+    prepend = getattr(storage, "_prepend_prefix", None)
+    return prepend(name) if prepend else name
+
+
+def _top_level_roots(roots):
+    # "requisitions/" já cobre "requisitions/icons/": lista cada pasta uma vez
+    roots = sorted({r.strip("/") + "/" for r in roots if r and r.strip("/")})
+    return [r for r in roots if not any(r != o and r.startswith(o) for o in roots)]
+
 
 class Command(BaseCommand):
-    help = "Remove referências antigas de imagens locais (/media/)"
+    help = (
+        "Manutenção da mídia: limpa referências com prefixos antigos (um UPDATE "
+        "por campo) e encontra arquivos órfãos no storage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix", action="append", dest="prefixes",
+            help=f"Prefixo antigo a limpar (repetível; padrão: {', '.join(DEFAULT_STALE_PREFIXES)})",
+        )
+        parser.add_argument("--orphans", action="store_true", help="Procura arquivos órfãos no storage")
+        parser.add_argument(
+            "--delete-orphans", action="store_true", help="Apaga os órfãos encontrados (implica --orphans)"
+        )
+        parser.add_argument(
+            "--root", action="append", dest="roots",
+            help="Pasta do storage a varrer (repetível; padrão: upload_to dos campos + miniaturas)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true", help="Só relata, não altera nada")
 
-    def handle(self, *args, **kwargs):
-        count = 0
+    def handle(self, *args, **opts):
+        self.dry_run = opts["dry_run"]
+        self.chunk_size = opts["chunk_size"]
+        started = time.monotonic()
 
-        for req in Requisition.objects.all():
-            if req.image and str(req.image).startswith("icons/"):
-                req.image = None
-                req.save()
-                count += 1
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("DRY-RUN: nada será alterado."))
 
-            if req.icon and str(req.icon).startswith("icons/"):
-                req.icon = None
-                req.save()
-                count += 1
+        cleared = self.clear_stale_prefixes(opts["prefixes"] or DEFAULT_STALE_PREFIXES)
 
-        for prod in Product.objects.all():
-            if prod.image and str(prod.image).startswith("products/"):
-                prod.image = None
-                prod.save()
-                count += 1
+        scanned = orphans = 0
+        if opts["orphans"] or opts["delete_orphans"]:
+            scanned, orphans = self.find_orphans(opts["roots"], delete=opts["delete_orphans"])
 
+        elapsed = time.monotonic() - started
+        rate = scanned / elapsed if elapsed else 0
+        verb = "seriam limpas" if self.dry_run else "limpas"
         self.stdout.write(
-            self.style.SUCCESS(f"{count} imagens antigas removidas com sucesso.")
+            self.style.SUCCESS(
+                f"{cleared} referências antigas {verb}; {scanned} arquivos verificados, "
+                f"{orphans} órfãos; {elapsed:.1f}s ({rate:.0f} arquivos/s)."
+            )
         )
+
+    # ======================================================
+    # PREFIXOS ANTIGOS
+    # ======================================================
+    def clear_stale_prefixes(self, prefixes):
+        """
+        Um UPDATE por campo com referência antiga; nenhuma instância carregada.
+        """
+        total = 0
+        affected_requisitions = set()
+
+        with transaction.atomic():
+            for model, field in file_fields():
+                stale = Q()
+                for prefix in prefixes:
+                    stale |= Q(**{f"{field.name}__startswith": prefix})
+                queryset = model._default_manager.filter(stale)
+
+                if model is Requisition and not self.dry_run:
+                    affected_requisitions.update(
+                        queryset.values_list("pk", flat=True).iterator(chunk_size=self.chunk_size)
+                    )
+
+                if self.dry_run:
+                    count = queryset.count()
+                else:
+                    count = queryset.update(**{field.name: None if field.null else ""})
+                if count:
+                    self.stdout.write(f"  {_label(model, field)}: {count}")
+                total += count
+
+        # fora da transação: Pillow + storage por requisição não seguram
+        # os locks dos UPDATEs
+        if affected_requisitions:
+            self._refresh_requisitions(affected_requisitions)
+
+        return total
+
+    def _refresh_requisitions(self, pks):
+        # o UPDATE não passa pelo post_save: miniaturas/URLs acertadas aqui
+        # (cada uma grava sozinha, via UPDATE próprio)
+        queryset = Requisition.objects.filter(pk__in=pks).only(
+            "id", "icon", "image", "thumbnails", "media_urls"
+        )
+        for req in queryset.iterator(chunk_size=self.chunk_size):
+            refresh_thumbnails(req)
+            refresh_media_urls(req)
+        transaction.on_commit(invalidate_catalog)
+
+    # ======================================================
+    # ÓRFÃOS
+    # ======================================================
+    def referenced_names(self, storage):
+        """
+        Todo nome de arquivo referenciado no banco (campos de arquivo +
+        miniaturas), lido em streaming, como o storage os lista.
+        """
+        names = set()
+        rows = 0
+        for model, field in file_fields():
+            queryset = (
+                model._default_manager.exclude(**{field.name: ""})
+                .exclude(**{f"{field.name}__isnull": True})
+                .values_list(field.name, flat=True)
+            )
+            for name in queryset.iterator(chunk_size=self.chunk_size):
+                names.add(_storage_name(storage, name))
+                rows += 1
+
+        thumbs = Requisition.objects.exclude(thumbnails={}).values_list("thumbnails", flat=True)
+        for thumbnails in thumbs.iterator(chunk_size=self.chunk_size):
+            names.update(_storage_name(storage, name) for name in thumbnail_names(thumbnails))
+            rows += 1
+
+        self.stdout.write(f"  {len(names)} arquivos referenciados ({rows} linhas lidas)")
+        return names
+
+    def _default_roots(self):
+        roots = [THUMBNAIL_ROOT]
+        for _, field in file_fields():
+            if isinstance(field.upload_to, str):
+                roots.append(field.upload_to.split("%", 1)[0])
+        return roots
+
+    def _walk(self, storage, path):
+        try:
+            dirs, files = storage.listdir(path)
+        except (FileNotFoundError, NotImplementedError):
+            return
+        for name in files:
+            yield f"{path}{name}"
+        for directory in dirs:
+            yield from self._walk(storage, f"{path}{directory}/")
+
+    def find_orphans(self, roots, delete=False):
+        """
+        Lista o storage uma vez e compara com os nomes referenciados.
+        """
+        storage = default_storage
+        referenced = self.referenced_names(storage)
+        scanned = orphans = 0
+
+        roots = [_storage_name(storage, root) for root in roots or self._default_roots()]
+        for root in _top_level_roots(roots):
+            for name in self._walk(storage, root):
+                scanned += 1
+                if scanned % 500 == 0:
+                    self.stdout.write(f"  ... {scanned} arquivos", ending="\r")
+                if name in referenced:
+                    continue
+                orphans += 1
+                self.stdout.write(f"  órfão: {name}")
+                if delete and not self.dry_run:
+                    storage.delete(name)
+
+        return scanned, orphans
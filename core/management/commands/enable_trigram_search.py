@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from requisicoes.search import create_trigram_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria a extensão pg_trgm e os índices GIN da busca (TrigramSearchBackend). "
+        "Rodar uma vez, com usuário que possa dar CREATE EXTENSION."
+    )
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "postgresql":
+            raise CommandError("pg_trgm só existe no Postgres; no SQLite use o MemorySearchBackend.")
+
+        with connection.cursor() as cursor:
+            create_trigram_indexes(cursor.execute)
+        self.stdout.write(self.style.SUCCESS("pg_trgm e índices GIN prontos."))
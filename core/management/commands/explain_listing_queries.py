@@ -0,0 +1,105 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from requisicoes.models import Order, OrderItem, OrderStatusHistory, Product
+from requisicoes.orders import ORDER_PAGE_SIZE, order_listing_queryset
+
+
+# Postgres: "Seq Scan on tabela". SQLite: "SCAN tabela" sem índice
+# ("SCAN x USING INDEX" percorre o índice na ordem certa e para no LIMIT).
+SEQ_SCAN_PATTERNS = [
+    re.compile(r"Seq Scan on (\w+)"),
+    re.compile(r"\bSCAN (\w+)(?! USING)(?!\w)"),
+]
+
+
+def listing_queries():
+    """
+    As queries quentes das listagens, com parâmetros tirados do próprio banco.
+    """
+    sample = Order.objects.values("id", "origin_location_id", "destination_location_id").first()
+    product = Product.objects.values("requisition_id").first()
+    if sample is None or product is None:
+        return None
+
+    page = ORDER_PAGE_SIZE + 1
+    board = order_listing_queryset(destination_location_id=sample["destination_location_id"])
+    mine = order_listing_queryset(origin_location_id=sample["origin_location_id"])
+    order_ids = list(board.order_by("-created_at", "-id").values_list("id", flat=True)[:page])
+
+    return {
+        "painel (destino)": board.order_by("-created_at", "-id")[:page],
+        "painel (destino + status)": board.filter(
+            status__in=[Order.Status.CRIADO, Order.Status.SEPARANDO]
+        ).order_by("-created_at", "-id")[:page],
+        "meus pedidos (origem)": mine.order_by("-created_at", "-id")[:page],
+        "itens da página": OrderItem.objects.filter(order_id__in=order_ids).select_related("product"),
+        "histórico do pedido": OrderStatusHistory.objects.filter(
+            order_id=sample["id"]
+        ).order_by("changed_at"),
+        "produtos da requisição": Product.objects.filter(
+            requisition_id=product["requisition_id"]
+        ).order_by("name"),
+    }
+
+
+# ordenação fora do índice: "USE TEMP B-TREE FOR ORDER BY" (SQLite),
+# nó "Sort"/"Incremental Sort" (Postgres). Ordena todos os pedidos da
+# filial antes do LIMIT.
+SORT_PATTERNS = [
+    re.compile(r"USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY|LAST TERM OF ORDER BY)"),
+    re.compile(r"(?:Incremental )?Sort(?:\s|$)", re.MULTILINE),
+]
+
+
+def sorts(plan):
+    return [m.group(0).strip() for p in SORT_PATTERNS for m in p.finditer(plan)]
+
+
+def sequential_scans(plan):
+    tables = set()
+    for pattern in SEQ_SCAN_PATTERNS:
+        tables.update(pattern.findall(plan))
+    return sorted(tables)
+
+
+class Command(BaseCommand):
+    help = (
+        "Roda EXPLAIN nas queries das listagens e falha se alguma fizer "
+        "varredura sequencial ou ordenar fora do índice. Rode depois do "
+        "seed_benchmark (volume real)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plans", action="store_true", help="Mostra o plano completo")
+
+    def handle(self, *args, **opts):
+        queries = listing_queries()
+        if queries is None:
+            raise CommandError("Banco sem pedidos/produtos: rode seed_benchmark antes do EXPLAIN.")
+
+        failures = []
+        for label, queryset in queries.items():
+            plan = queryset.explain()
+            scans = sequential_scans(plan)
+            sorted_outside = sorts(plan)
+
+            if scans:
+                self.stdout.write(self.style.ERROR(f"✗ {label}: scan sequencial em {', '.join(scans)}"))
+            if sorted_outside:
+                self.stdout.write(self.style.ERROR(f"✗ {label}: ordenação fora do índice ({sorted_outside[0]})"))
+            if scans or sorted_outside:
+                failures.append(label)
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✓ {label}"))
+
+            if opts["verbose_plans"] or scans or sorted_outside:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} listagem(ns) sem índice adequado no {connection.vendor}: {', '.join(failures)}"
+            )
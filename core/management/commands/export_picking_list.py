@@ -0,0 +1,46 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from requisicoes.branch import AUSTIN
+from requisicoes.models import Location, Order
+from requisicoes.picking import build_picking_pdf, select_orders
+
+
+class Command(BaseCommand):
+    help = "Gera um PDF único com a lista de separação consolidada + uma página por pedido"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", required=True, help="Arquivo PDF de saída")
+        parser.add_argument("--status", default=Order.Status.SEPARANDO, choices=Order.Status.values)
+        parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="AAAA-MM-DD")
+        parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="AAAA-MM-DD")
+        parser.add_argument("--location", default=AUSTIN, help="Filial destino dos pedidos")
+        parser.add_argument("--workers", type=int, default=None, help="Processos de renderização")
+
+    def handle(self, *args, **opts):
+        location = Location.objects.filter(name=opts["location"]).first()
+        if location is None:
+            raise CommandError(f"Filial '{opts['location']}' não existe.")
+
+        filters = {
+            "status": opts["status"],
+            "date_from": opts["date_from"],
+            "date_to": opts["date_to"],
+        }
+        orders = select_orders(destination_location=location, **filters)
+        if not orders.exists():
+            raise CommandError("Nenhum pedido encontrado com esses filtros.")
+
+        started = time.monotonic()
+        data, count = build_picking_pdf(orders, filters=filters, workers=opts["workers"])
+
+        with open(opts["output"], "wb") as fh:
+            fh.write(data)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} pedidos exportados em {time.monotonic() - started:.1f}s -> {opts['output']}"
+            )
+        )
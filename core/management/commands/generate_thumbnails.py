@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from requisicoes.catalog import invalidate_catalog
+from requisicoes.media_urls import get_url_resolver, resolve_media_urls
+from requisicoes.models import Requisition
+from requisicoes.thumbnails import build_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera as miniaturas (WebP/PNG) das requisições já cadastradas e grava "
+        "as URLs públicas resolvidas (media_urls)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Threads gerando imagens")
+        parser.add_argument("--force", action="store_true", help="Regera mesmo as que estão em dia")
+        parser.add_argument(
+            "--urls-only", action="store_true",
+            help="Só recalcula as URLs (trocou storage/CDN), sem gerar imagens",
+        )
+        parser.add_argument("--chunk-size", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        queryset = Requisition.objects.only(
+            "id", "icon", "image", "thumbnails", "media_urls"
+        ).order_by("id")
+        if not opts["urls_only"]:
+            queryset = queryset.exclude(
+                Q(icon="") | Q(icon__isnull=True), Q(image="") | Q(image__isnull=True)
+            )
+        total = queryset.count()
+        if not total:
+            self.stdout.write("Nenhuma requisição com imagem.")
+            return
+
+        force, urls_only = opts["force"], opts["urls_only"]
+        resolver = get_url_resolver()
+
+        def work(req):
+            # só Pillow + storage aqui; o UPDATE fica na thread principal
+            changes = {}
+            if not urls_only:
+                thumbnails = build_thumbnails(req, force=force)
+                if thumbnails is not None:
+                    req.thumbnails = changes["thumbnails"] = thumbnails
+            urls = resolve_media_urls(req, resolver)
+            if urls != req.media_urls:
+                changes["media_urls"] = urls
+            return req.pk, changes
+
+        started = time.monotonic()
+        done = updated = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, opts["workers"])) as pool:
+            results = pool.map(work, queryset.iterator(chunk_size=opts["chunk_size"]))
+            for pk, changes in results:
+                done += 1
+                if changes:
+                    Requisition.objects.filter(pk=pk).update(**changes)
+                    updated += 1
+                self.stdout.write(f"  ... {done}/{total}", ending="\r")
+
+        if updated:
+            invalidate_catalog()
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{updated} de {total} requisições atualizadas em {time.monotonic() - started:.1f}s."
+            )
+        )
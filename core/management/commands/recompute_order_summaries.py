@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from requisicoes.models import Order, OrderItem, OrderStatusHistory
+
+
+def summary_expressions():
+    """
+    Expressões do UPDATE que recalculam o resumo de cada pedido no próprio banco.
+    """
+    items = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+    history = OrderStatusHistory.objects.filter(order=OuterRef("pk")).values("order")
+    return {
+        "item_count": Coalesce(Subquery(items.annotate(c=Count("id")).values("c")), 0),
+        "total_quantity": Coalesce(Subquery(items.annotate(t=Sum("quantity")).values("t")), 0),
+        "status_changed_at": Coalesce(
+            Subquery(history.annotate(m=Max("changed_at")).values("m")), F("created_at")
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = "Recalcula item_count, total_quantity e status_changed_at de todos os pedidos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Pedidos por UPDATE")
+
+    def handle(self, *args, **opts):
+        batch = opts["batch_size"]
+        bounds = Order.objects.aggregate(lo=Min("id"), hi=Max("id"))
+        if not bounds["hi"]:
+            self.stdout.write("Nenhum pedido.")
+            return
+
+        started = time.monotonic()
+        updated = 0
+        expressions = summary_expressions()
+
+        # um UPDATE por faixa de ids: sem carregar pedido nenhum em memória
+        for start in range(bounds["lo"], bounds["hi"] + 1, batch):
+            updated += Order.objects.filter(id__gte=start, id__lt=start + batch).update(
+                version=F("version") + 1, **expressions
+            )
+            self.stdout.write(f"  ... {updated} pedidos", ending="\r")
+
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{updated} pedidos recalculados em {time.monotonic() - started:.1f}s."
+            )
+        )
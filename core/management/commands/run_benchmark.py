@@ -0,0 +1,158 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core.management.commands.seed_benchmark import bench_username
+from requisicoes.branch import AUSTIN, QUEIMADOS
+from requisicoes.models import Order, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência (p50/p95) e nº de queries das views principais via "
+        "test client. Rode depois do seed_benchmark. Por padrão tudo roda "
+        "numa transação desfeita no final (o banco não muda)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--cart-lines", type=int, default=30, help="Linhas no carrinho de cart_view/cart_submit")
+        parser.add_argument("--json", dest="json_path", help="Salva o resultado em JSON")
+        parser.add_argument("--keep", action="store_true", help="Não desfaz os pedidos criados/avançados")
+
+    def handle(self, *args, **opts):
+        try:
+            queimados = User.objects.get(username=bench_username(QUEIMADOS))
+            austin = User.objects.get(username=bench_username(AUSTIN))
+        except User.DoesNotExist:
+            raise CommandError("Usuários de benchmark não existem: rode seed_benchmark antes.")
+
+        self.iterations = opts["iterations"]
+        self.product_ids = list(Product.objects.values_list("id", flat=True)[:opts["cart_lines"]])
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=["*"], SECURE_SSL_REDIRECT=False, DEBUG=False):
+            try:
+                with transaction.atomic():
+                    results = self._run(queimados, austin)
+                    if not opts["keep"]:
+                        raise Rollback()
+            except Rollback:
+                pass
+
+        report = {
+            "commit": _git_commit(),
+            "database": connection.vendor,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "iterations": self.iterations,
+            "views": results,
+        }
+
+        self._print(results)
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2, ensure_ascii=False)
+            self.stdout.write(f"JSON salvo em {opts['json_path']}")
+
+    # --------------------------------------------------
+    def _measure(self, name, request, prepare=None, expect=(200, 302)):
+        timings = []
+        queries = []
+        for i in range(self.iterations):
+            if prepare:
+                prepare(i)
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = request(i)
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code not in expect:
+                raise CommandError(f"{name}: status {response.status_code}")
+            timings.append(elapsed)
+            queries.append(len(ctx))
+
+        return {
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "mean_ms": round(statistics.fmean(timings), 2),
+            "queries_median": statistics.median(queries),
+            "queries_max": max(queries),
+        }
+
+    def _fill_cart(self, client):
+        for pid in self.product_ids:
+            client.post(reverse("cart_add", args=[pid]), {"quantity": 2})
+
+    def _run(self, queimados, austin):
+        q = Client()
+        q.force_login(queimados)
+        a = Client()
+        a.force_login(austin)
+
+        results = {}
+        results["requisition_list"] = self._measure(
+            "requisition_list", lambda i: q.get(reverse("requisition_list")))
+
+        self._fill_cart(q)
+        results["cart_view"] = self._measure(
+            "cart_view", lambda i: q.get(reverse("cart_view")))
+
+        results["cart_submit"] = self._measure(
+            "cart_submit",
+            lambda i: q.post(reverse("cart_submit")),
+            prepare=lambda i: self._fill_cart(q),
+        )
+
+        results["admin_home"] = self._measure(
+            "admin_home", lambda i: a.get(reverse("admin_home")))
+
+        results["user_orders"] = self._measure(
+            "user_orders", lambda i: q.get(reverse("user_orders")))
+
+        pending = list(
+            Order.objects.filter(
+                destination_location=austin.profile.location,
+                status=Order.Status.CRIADO,
+            ).values_list("id", flat=True)[:self.iterations]
+        )
+        if len(pending) < self.iterations:
+            raise CommandError("Poucos pedidos CRIADO para medir advance_status.")
+        results["advance_status"] = self._measure(
+            "advance_status", lambda i: a.post(reverse("advance_status", args=[pending[i]])))
+
+        return results
+
+    def _print(self, results):
+        self.stdout.write(f"{'view':<20}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}")
+        for name, r in results.items():
+            self.stdout.write(f"{name:<20}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['queries_median']:>10}")
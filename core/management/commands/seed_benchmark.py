@@ -0,0 +1,191 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from requisicoes.branch import AUSTIN, QUEIMADOS
+from requisicoes.catalog import invalidate_catalog
+from requisicoes.models import (
+    Location,
+    Order,
+    OrderItem,
+    OrderStatusHistory,
+    Product,
+    Requisition,
+    UserProfile,
+)
+
+
+# fluxo completo de um pedido, na ordem
+FLOW = [
+    Order.Status.CRIADO,
+    Order.Status.RECEBIDO_DESTINO,
+    Order.Status.SEPARANDO,
+    Order.Status.ENVIADO,
+    Order.Status.RECEBIDO_ORIGEM,
+]
+
+BENCH_PREFIX = "bench_"
+
+
+@contextmanager
+def historical_timestamps():
+    """
+    Desliga o auto_now_add de created_at/changed_at durante o seed pra
+    gravar datas espalhadas no passado direto no bulk_create.
+    """
+    fields = [
+        Order._meta.get_field("created_at"),
+        OrderStatusHistory._meta.get_field("changed_at"),
+    ]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f in fields:
+            f.auto_now_add = True
+
+
+def bench_username(location_name):
+    return BENCH_PREFIX + location_name.lower().replace(" ", "_")
+
+
+class Command(BaseCommand):
+    help = "Popula o banco com volume realista (filiais, catálogo, pedidos, itens e histórico)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--branches", type=int, default=5, help="Filiais de origem além de Queimados")
+        parser.add_argument("--requisitions", type=int, default=40)
+        parser.add_argument("--products", type=int, default=50, help="Produtos por requisição")
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--items", type=int, default=12, help="Itens por pedido (média)")
+        parser.add_argument("--days", type=int, default=180, help="Espalha os pedidos nos últimos N dias")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        batch = opts["batch_size"]
+        started = time.monotonic()
+
+        with transaction.atomic():
+            austin, origins = self._locations(opts["branches"])
+            users = self._users([austin, *origins])
+            product_ids = self._catalog(opts["requisitions"], opts["products"], batch)
+        # bulk_create não dispara post_save: invalida o cache do catálogo na mão
+        invalidate_catalog()
+
+        counts = {"orders": 0, "items": 0, "history": 0}
+        now = timezone.now()
+        span = opts["days"] * 86400
+
+        with historical_timestamps():
+            remaining = opts["orders"]
+            while remaining > 0:
+                size = min(batch, remaining)
+                with transaction.atomic():
+                    self._orders_batch(
+                        rng, size, austin, origins, users, product_ids,
+                        opts["items"], now, span, batch, counts,
+                    )
+                remaining -= size
+                self.stdout.write(f"  ... {counts['orders']} pedidos", ending="\r")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(origins)} filiais de origem, {len(product_ids)} produtos, "
+                f"{counts['orders']} pedidos, {counts['items']} itens, "
+                f"{counts['history']} históricos em {elapsed:.1f}s."
+            )
+        )
+
+    # --------------------------------------------------
+    def _locations(self, branches):
+        names = [AUSTIN, QUEIMADOS] + [f"Filial {i:02d}" for i in range(1, branches + 1)]
+        existing = set(Location.objects.filter(name__in=names).values_list("name", flat=True))
+        Location.objects.bulk_create([Location(name=n) for n in names if n not in existing])
+
+        locations = {loc.name: loc for loc in Location.objects.filter(name__in=names)}
+        return locations[AUSTIN], [locations[n] for n in names[1:]]
+
+    def _users(self, locations):
+        users = {}
+        for loc in locations:
+            user, created = User.objects.get_or_create(username=bench_username(loc.name))
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=["password"])
+            UserProfile.objects.update_or_create(user=user, defaults={"location": loc})
+            users[loc.id] = user.id
+        return users
+
+    def _catalog(self, requisitions, products, batch):
+        reqs = Requisition.objects.bulk_create([
+            Requisition(name=f"Requisição {i:03d}") for i in range(1, requisitions + 1)
+        ])
+        created = Product.objects.bulk_create(
+            [
+                Product(requisition=req, name=f"Produto {req.id}-{j:03d}")
+                for req in reqs
+                for j in range(1, products + 1)
+            ],
+            batch_size=batch,
+        )
+        return [p.id for p in created]
+
+    def _orders_batch(self, rng, size, austin, origins, users, product_ids,
+                      avg_items, now, span, batch, counts):
+        orders = []
+        plans = []
+        for _ in range(size):
+            origin = rng.choice(origins)
+            created_at = now - timedelta(seconds=rng.randint(0, span))
+            steps = FLOW[:rng.randint(1, len(FLOW))]
+            stamps = [created_at]
+            for _ in steps[1:]:
+                stamps.append(stamps[-1] + timedelta(minutes=rng.randint(5, 60 * 24)))
+
+            lines = rng.sample(product_ids, max(1, min(len(product_ids), int(rng.gauss(avg_items, avg_items / 3)))))
+            quantities = [rng.randint(1, 30) for _ in lines]
+
+            orders.append(Order(
+                created_by_id=users[origin.id],
+                origin_location=origin,
+                destination_location=austin,
+                status=steps[-1],
+                created_at=created_at,
+                item_count=len(lines),
+                total_quantity=sum(quantities),
+                status_changed_at=stamps[-1],
+            ))
+            plans.append((origin, steps, stamps, lines, quantities))
+
+        Order.objects.bulk_create(orders, batch_size=batch)
+
+        items = []
+        history = []
+        for order, (origin, steps, stamps, lines, quantities) in zip(orders, plans):
+            items.extend(
+                OrderItem(order=order, product_id=pid, quantity=q)
+                for pid, q in zip(lines, quantities)
+            )
+            for status, stamp in zip(steps, stamps):
+                actor = origin if status in (Order.Status.CRIADO, Order.Status.RECEBIDO_ORIGEM) else austin
+                history.append(OrderStatusHistory(
+                    order=order, status=status, changed_at=stamp, changed_by_id=users[actor.id],
+                ))
+
+        OrderItem.objects.bulk_create(items, batch_size=batch)
+        OrderStatusHistory.objects.bulk_create(history, batch_size=batch)
+
+        counts["orders"] += len(orders)
+        counts["items"] += len(items)
+        counts["history"] += len(history)
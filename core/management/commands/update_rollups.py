@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from requisicoes.rollups import reset_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza os rollups diários do dashboard com o histórico de status "
+        "novo desde a última execução (rodar periodicamente, ex.: a cada 5 min)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Linhas de histórico por transação")
+        parser.add_argument(
+            "--settle-seconds", type=int, default=60,
+            help="Ignora histórico mais novo que isso (transações ainda abertas)",
+        )
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Apaga os rollups e refaz a partir de todo o histórico",
+        )
+
+    def handle(self, *args, **opts):
+        started = time.monotonic()
+        if opts["rebuild"]:
+            reset_rollups()
+            self.stdout.write("Rollups apagados; refazendo do zero.")
+
+        processed = update_rollups(
+            batch_size=opts["batch_size"],
+            settle_seconds=opts["settle_seconds"],
+            progress=lambda n: self.stdout.write(f"  ... {n} linhas", ending="\r"),
+        )
+
+        elapsed = time.monotonic() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{processed} linhas de histórico somadas em {elapsed:.1f}s ({rate:.0f}/s)."
+            )
+        )
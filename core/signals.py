@@ -1,8 +1,20 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 
-from requisicoes.models import UserProfile
+from requisicoes.catalog import invalidate_catalog
+from requisicoes.media_urls import refresh_media_urls
+from requisicoes.models import (
+    UserProfile, Requisition, Product, Order, OrderItem, OrderStatusHistory,
+)
+from requisicoes.orders import (
+    bump_order_version, refresh_order_summary, refresh_order_summary_on_commit,
+)
+from requisicoes.pdf import invalidate_order_pdf
+from requisicoes.pending import invalidate_pending
+from requisicoes.search import get_search_backend
+from requisicoes.thumbnails import refresh_thumbnails
 
 
 @receiver(post_save, sender=User)
@@ -13,3 +25,99 @@ def create_profile(sender, instance, created, **kwargs):
     """
     if created:
         UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Requisition)
+@receiver(post_delete, sender=Requisition)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Qualquer mudança no catálogo (admin com ProductInline) troca a versão
+    do cache das telas de requisições. Só depois do commit: antes disso
+    outro request poderia remontar o snapshot com os dados antigos já
+    sob a versão nova.
+    """
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def update_search_product(sender, instance, **kwargs):
+    """
+    Atualiza só esse produto no índice de busca (depois do commit).
+    """
+    pk = instance.pk  # depois do delete o Django zera o pk
+    transaction.on_commit(lambda: get_search_backend().product_changed(pk))
+
+
+@receiver(post_save, sender=Requisition)
+def update_search_requisition(sender, instance, **kwargs):
+    # nome da requisição também é pesquisável
+    pk = instance.pk
+    transaction.on_commit(lambda: get_search_backend().requisition_changed(pk))
+
+
+@receiver(post_save, sender=Requisition)
+def store_requisition_media_urls(sender, instance, **kwargs):
+    """
+    Resolve as URLs do ícone/imagem uma vez, ao salvar (o storage já deu
+    o nome final do arquivo aqui). Listagens só leem media_urls.
+    """
+    refresh_media_urls(instance)
+
+
+@receiver(post_save, sender=Requisition)
+def generate_requisition_thumbnails(sender, instance, **kwargs):
+    """
+    Gera as miniaturas (WebP/PNG) do ícone/imagem depois do commit. Se o
+    arquivo não mudou, build_thumbnails não faz nada.
+    """
+    def run():
+        if refresh_thumbnails(instance) is not None:
+            refresh_media_urls(instance)
+            invalidate_catalog()
+
+    transaction.on_commit(run)
+
+
+@receiver(post_save, sender=OrderStatusHistory)
+def invalidate_order_pdf_cache(sender, instance, created, **kwargs):
+    """
+    Mudou o status: o PDF em cache do pedido não vale mais.
+    """
+    if created:
+        invalidate_order_pdf(instance.order_id)
+
+
+@receiver(post_delete, sender=Order)
+def invalidate_pending_count(sender, instance, **kwargs):
+    """
+    Pedido apagado (admin): recalcula o badge da filial destino.
+    """
+    invalidate_pending(instance.destination_location_id)
+
+
+@receiver(post_save, sender=OrderItem)
+def refresh_summary_on_item_change(sender, instance, **kwargs):
+    """
+    Item editado (admin): resumo (item_count/total_quantity) recalculado e
+    o card em cache do pedido não vale mais.
+    """
+    refresh_order_summary(instance.order_id)
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_summary_on_item_delete(sender, instance, using, **kwargs):
+    """
+    Item removido: mesmo recálculo, mas no commit e uma vez por pedido
+    (apagar o pedido apaga os itens um a um).
+    """
+    refresh_order_summary_on_commit(instance.order_id, using=using)
+
+
+@receiver(post_save, sender=Order)
+def bump_version_on_order_save(sender, instance, created, **kwargs):
+    # views usam UPDATE condicional (transitions); save() aqui = edição no admin
+    if not created:
+        bump_order_version(pk=instance.pk)
@@ -1,3 +1,1419 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from requisicoes.models import Location, Order, OrderItem, OrderStatusHistory, Product, Requisition
+from requisicoes.transitions import DESTINATION, TransitionConflict, advance
+
+
+def create_branches(target):
+    """
+    Queimados e Austin, cada uma com um usuário já na filial:
+    target.queimados/target.user e target.austin/target.admin (target é o
+    self do setUp ou o cls do setUpTestData).
+    """
+    target.queimados = Location.objects.create(name="Queimados")
+    target.austin = Location.objects.create(name="Austin")
+    target.user = User.objects.create_user("queimados")
+    target.user.profile.location = target.queimados
+    target.user.profile.save()
+    target.admin = User.objects.create_user("austin")
+    target.admin.profile.location = target.austin
+    target.admin.profile.save()
+
+
+def create_order(target, status=Order.Status.CRIADO, destination=None):
+    """
+    Pedido de Queimados (target.user) pra Austin, direto no banco.
+    """
+    return Order.objects.create(
+        created_by=target.user, origin_location=target.queimados,
+        destination_location=destination or target.austin, status=status,
+    )
+
+
+class ListingQueryCountTest(TestCase):
+    """
+    Listagens com N e 3N pedidos/requisições: o número de queries não
+    pode crescer com a página (N+1).
+    """
+
+    def setUp(self):
+        self.queimados = Location.objects.create(name="Queimados")
+        self.austin = Location.objects.create(name="Austin")
+        self.user = User.objects.create_user("queimados")
+        self.user.profile.location = self.queimados
+        self.user.profile.save()
+        self.admin = User.objects.create_user("austin")
+        self.admin.profile.location = self.austin
+        self.admin.profile.save()
+        self.statuses = Order.Status.values
+
+    def _seed(self, count):
+        for i in range(count):
+            req = Requisition.objects.create(name=f"Requisição {i}")
+            products = Product.objects.bulk_create(
+                [Product(requisition=req, name=f"Produto {i}-{j}") for j in range(3)]
+            )
+            order = Order.objects.create(
+                created_by=self.user, origin_location=self.queimados,
+                destination_location=self.austin, status=self.statuses[i % len(self.statuses)],
+            )
+            OrderItem.objects.bulk_create(
+                [OrderItem(order=order, product=p, quantity=j + 1) for j, p in enumerate(products)]
+            )
+            OrderStatusHistory.objects.create(order=order, status=order.status, changed_by=self.admin)
+
+    def _queries(self, user, url):
+        cache.clear()
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def _counts(self):
+        return {
+            "requisition_list": self._queries(self.user, "/requisicoes/"),
+            "user_orders": self._queries(self.user, "/meus-pedidos/"),
+            "admin_home": self._queries(self.admin, "/xodo-admin/"),
+        }
+
+    def test_query_count_independent_of_rows(self):
+        self._seed(4)
+        small = self._counts()
+        self._seed(8)
+        self.assertEqual(Order.objects.count(), 12)
+        self.assertEqual(self._counts(), small)
+
+    def test_cursor_round_trip(self):
+        from requisicoes.orders import ORDER_SORTS, decode_cursor, encode_cursor
+
+        self._seed(1)
+        order = Order.objects.get()
+        for sort, (field_name, _) in ORDER_SORTS.items():
+            value, pk = decode_cursor(encode_cursor(order, sort), sort)
+            self.assertEqual((value, pk), (getattr(order, field_name), order.id))
+        self.assertIsNone(decode_cursor("lixo"))
+        self.assertIsNone(decode_cursor(None))
+
+
+class SubmitCartTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("queimados")
+        self.origin = Location.objects.create(name="Queimados")
+        self.destination = Location.objects.create(name="Austin")
+        req = Requisition.objects.create(name="Limpeza")
+        self.products = Product.objects.bulk_create(
+            [Product(requisition=req, name=f"Produto {i}") for i in range(50)]
+        )
+
+    def test_parse_cart_drops_invalid_lines(self):
+        from requisicoes.cart import parse_cart
+
+        self.assertEqual(parse_cart({"1": "2", "x": 1, "3": 0, "4": None, 5: 1}), {1: 2, 5: 1})
+        self.assertEqual(parse_cart(None), {})
+
+    def test_items_loaded_in_one_query(self):
+        from requisicoes.cart import load_cart_items
+
+        cart = {str(p.id): 2 for p in self.products}
+        cart["999999"] = 1
+        with self.assertNumQueries(1):
+            items = load_cart_items(cart)
+            names = {item["product"].requisition.name for item in items}
+        self.assertEqual(len(items), 50)
+        self.assertEqual(names, {"Limpeza"})
+
+    def test_submit_query_count_independent_of_lines(self):
+        from requisicoes.cart import submit_cart
+
+        def queries(products):
+            cart = {str(p.id): 3 for p in products}
+            with CaptureQueriesContext(connection) as ctx:
+                submit_cart(cart, self.user, self.origin.id, self.destination.id)
+            return len(ctx)
+
+        self.assertEqual(queries(self.products[:5]), queries(self.products))
+        order = Order.objects.latest("id")
+        self.assertEqual((order.item_count, order.total_quantity), (50, 150))
+        self.assertEqual(order.items.count(), 50)
+        self.assertEqual(order.status_history.get().status, Order.Status.CRIADO)
+
+    def test_unknown_products_only_is_rejected(self):
+        from requisicoes.cart import CartError, submit_cart
+
+        with self.assertRaises(CartError):
+            submit_cart({"999999": 1}, self.user, self.origin.id, self.destination.id)
+        self.assertFalse(Order.objects.exists())
+
+    def test_dropped_products_returned_and_reported(self):
+        from requisicoes.cart import submit_cart
+
+        cart = {str(self.products[0].id): 1, "999998": 1, "999999": 2}
+        order, dropped = submit_cart(cart, self.user, self.origin.id, self.destination.id)
+        self.assertEqual(order.items.count(), 1)
+        self.assertEqual(dropped, [999998, 999999])
+
+        self.user.profile.location = self.origin
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.client.post(f"/lista/add/{self.products[1].id}/", {"quantity": 1}, secure=True)
+        self.client.post("/lista/add/999999/", {"quantity": 1}, secure=True)
+        response = self.client.post("/lista/enviar/", secure=True, follow=True)
+        self.assertContains(response, "Produtos não encontrados ficaram fora do pedido (ids: 999999).")
+
+    def test_cart_kept_when_submit_fails(self):
+        self.user.profile.location = self.origin
+        self.user.profile.save()
+        self.client.force_login(self.user)
+        self.client.post("/lista/add/999999/", {"quantity": 3}, secure=True)
+
+        response = self.client.post("/lista/enviar/", secure=True, follow=True)
+        self.assertContains(response, "Carrinho vazio.")
+        self.assertFalse(Order.objects.exists())
+        self.client.post(f"/lista/add/{self.products[0].id}/", {"quantity": 1}, secure=True)
+        response = self.client.post("/lista/enviar/", secure=True, follow=True)
+        # a linha inválida continuou no carrinho e foi descartada de novo no envio
+        self.assertContains(response, "(ids: 999999)")
+        self.assertEqual(Order.objects.get().items.count(), 1)
+
+
+class BranchTest(TestCase):
+    def setUp(self):
+        self.queimados = Location.objects.create(name="Queimados")
+        self.user = User.objects.create_user("queimados", password="x")
+        self.user.profile.location = self.queimados
+        self.user.profile.save()
+
+    def test_backend_loads_branch_with_user(self):
+        from requisicoes.backends import BranchModelBackend
+        from requisicoes.branch import branch_for_user
+
+        with self.assertNumQueries(1):
+            user = BranchModelBackend().get_user(self.user.pk)
+            branch = branch_for_user(user)
+        self.assertEqual(branch.location_id, self.queimados.id)
+        self.assertTrue(branch.is_queimados)
+        self.assertFalse(branch.is_austin)
+
+    def test_branch_without_location(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        from requisicoes.branch import ANONYMOUS_BRANCH, branch_for_user
+
+        self.assertIs(branch_for_user(AnonymousUser()), ANONYMOUS_BRANCH)
+        self.user.profile.location = None
+        self.user.profile.save()
+        branch = branch_for_user(User.objects.select_related("profile__location").get(pk=self.user.pk))
+        self.assertEqual(branch.user_id, self.user.pk)
+        self.assertFalse(branch.has_location)
+
+    def test_routing_by_branch(self):
+        self.client.login(username="queimados", password="x")
+        self.assertEqual(self.client.get("/requisicoes/", secure=True).status_code, 200)
+        self.assertEqual(self.client.get("/xodo-admin/", secure=True).status_code, 403)
+
+        User.objects.create_user("semfilial", password="x")
+        self.client.login(username="semfilial", password="x")
+        response = self.client.get("/requisicoes/", secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], "/setup/")
+
+
+class CatalogCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+
+    def test_version_changes_only_after_commit(self):
+        from requisicoes.catalog import catalog_version, requisitions_snapshot
+
+        req = Requisition.objects.create(name="Limpeza")
+        requisitions_snapshot()
+        before = catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Product.objects.create(requisition=req, name="Detergente")
+            # dentro da transação ninguém remonta o snapshot sob versão nova
+            self.assertEqual(catalog_version(), before)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(catalog_version(), before)
+
+    def test_snapshot_cached_until_invalidated(self):
+        from requisicoes.catalog import requisitions_snapshot
+
+        Requisition.objects.create(name="Limpeza")
+        requisitions_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual([r["name"] for r in requisitions_snapshot()], ["Limpeza"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Requisition.objects.create(name="Açougue")
+        self.assertEqual(
+            [r["name"] for r in requisitions_snapshot()], ["Açougue", "Limpeza"]
+        )
+
+
+class OrderPdfCacheTest(TestCase):
+    def setUp(self):
+        queimados = Location.objects.create(name="Queimados")
+        austin = Location.objects.create(name="Austin")
+        self.user = User.objects.create_user("austin")
+        self.user.profile.location = austin
+        self.user.profile.save()
+        product = Product.objects.create(requisition=Requisition.objects.create(name="R"), name="P")
+        self.order = Order.objects.create(
+            created_by=self.user, origin_location=queimados, destination_location=austin,
+        )
+        OrderItem.objects.create(order=self.order, product=product, quantity=1)
+        OrderStatusHistory.objects.create(order=self.order, status=self.order.status, changed_by=self.user)
+        self.client.force_login(self.user)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+        settings = override_settings(PDF_CACHE_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_rendered_once_then_conditional(self):
+        from unittest import mock
+
+        url = f"/xodo-admin/pedidos/{self.order.id}/pdf/"
+        response = self.client.get(url, secure=True)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        etag = response["ETag"]
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with mock.patch("requisicoes.pdf.render_order_pdf") as render:
+            again = self.client.get(url, secure=True)
+            b"".join(again.streaming_content)
+            not_modified = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        render.assert_not_called()
+        self.assertEqual(again["ETag"], etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_new_status_gets_new_version(self):
+        url = f"/xodo-admin/pedidos/{self.order.id}/pdf/"
+        etag = self.client.get(url, secure=True)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/xodo-admin/avancar/{self.order.id}/", secure=True)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_item_edit_gets_new_version(self):
+        url = f"/xodo-admin/pedidos/{self.order.id}/pdf/"
+        etag = self.client.get(url, secure=True)["ETag"]
+
+        # admin edita um item: não há histórico novo, só version + 1
+        item = self.order.items.get()
+        item.quantity = 5
+        item.save()
+        response = self.client.get(url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_file_removed_by_another_worker_is_rendered_again(self):
+        url = f"/xodo-admin/pedidos/{self.order.id}/pdf/"
+        b"".join(self.client.get(url, secure=True).streaming_content)
+        for name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, name))
+
+        response = self.client.get(url, secure=True)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+
+class PickingListTest(TestCase):
+    def setUp(self):
+        self.austin = Location.objects.create(name="Austin")
+        queimados = Location.objects.create(name="Queimados")
+        self.user = User.objects.create_user("austin")
+        self.user.profile.location = self.austin
+        self.user.profile.save()
+        req = Requisition.objects.create(name="Limpeza")
+        products = [Product.objects.create(requisition=req, name=f"P{i}") for i in range(2)]
+        for _ in range(3):
+            order = Order.objects.create(
+                created_by=self.user, origin_location=queimados,
+                destination_location=self.austin, status=Order.Status.SEPARANDO,
+            )
+            OrderItem.objects.bulk_create(
+                [OrderItem(order=order, product=p, quantity=2) for p in products]
+            )
+        self.client.force_login(self.user)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_aggregate_in_one_query(self):
+        from requisicoes.picking import aggregate_items, select_orders
+
+        with self.assertNumQueries(1):
+            rows = aggregate_items(select_orders(status=Order.Status.SEPARANDO))
+        self.assertEqual([(r["total"], r["orders"]) for r in rows], [(6, 3), (6, 3)])
+
+    def test_view_renders_in_process(self):
+        from unittest import mock
+
+        with override_settings(PDF_CACHE_DIR=self.tmp.name), \
+                mock.patch("requisicoes.picking.ProcessPoolExecutor") as pool:
+            response = self.client.get("/xodo-admin/separacao/pdf/", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        pool.assert_not_called()
+
+    def test_view_refuses_large_batch(self):
+        with override_settings(PDF_CACHE_DIR=self.tmp.name, PICKING_MAX_ORDERS=2):
+            response = self.client.get("/xodo-admin/separacao/pdf/", secure=True, follow=True)
+        self.assertEqual(response.redirect_chain[0], ("/xodo-admin/", 302))
+        self.assertContains(response, "Lote grande demais (3 pedidos, máximo 2)")
+
+
+class OrderQrTest(TestCase):
+    def setUp(self):
+        queimados = Location.objects.create(name="Queimados")
+        austin = Location.objects.create(name="Austin")
+        outra = Location.objects.create(name="Outra")
+        self.user = User.objects.create_user("queimados")
+        self.user.profile.location = queimados
+        self.user.profile.save()
+        self.stranger = User.objects.create_user("outra")
+        self.stranger.profile.location = outra
+        self.stranger.profile.save()
+        self.order = Order.objects.create(
+            created_by=self.user, origin_location=queimados, destination_location=austin,
+        )
+
+    def test_only_order_branches_get_the_png(self):
+        url = f"/pedido/{self.order.id}/qr.png"
+        self.client.force_login(self.user)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+
+    def test_lru_size_read_on_first_call(self):
+        from requisicoes.qrcodes import qr_png
+
+        qr_png.cache_clear()
+        self.addCleanup(qr_png.cache_clear)
+        with override_settings(QR_CACHE_SIZE=1):
+            qr_png("https://example.com/a")
+            qr_png("https://example.com/b")
+            self.assertEqual(qr_png.cache_info().maxsize, 1)
+            self.assertEqual(qr_png.cache_info().currsize, 1)
+
+
+class OrderSummaryTest(TestCase):
+    def test_admin_item_changes_refresh_summary(self):
+        loc = Location.objects.create(name="Austin")
+        user = User.objects.create_user("u")
+        req = Requisition.objects.create(name="R")
+        p1 = Product.objects.create(requisition=req, name="a")
+        p2 = Product.objects.create(requisition=req, name="b")
+        order = Order.objects.create(created_by=user, origin_location=loc, destination_location=loc)
+
+        item = OrderItem.objects.create(order=order, product=p1, quantity=3)
+        OrderItem.objects.create(order=order, product=p2, quantity=2)
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.total_quantity), (2, 5))
+        version = order.version
+
+        item.quantity = 10
+        with self.assertNumQueries(3):  # save + aggregate + UPDATE
+            item.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.total_quantity), (1, 2))
+        self.assertGreater(order.version, version)
+
+    def test_order_delete_skips_summary_refresh(self):
+        loc = Location.objects.create(name="Austin")
+        user = User.objects.create_user("u")
+        req = Requisition.objects.create(name="R")
+        order = Order.objects.create(created_by=user, origin_location=loc, destination_location=loc)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=Product.objects.create(requisition=req, name=f"p{i}"), quantity=1)
+            for i in range(5)
+        ])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            order.delete()
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+        # um callback pros 5 itens, e só o SELECT que vê que o pedido sumiu
+        refreshes = [cb for cb in callbacks if type(cb).__name__ == "_SummaryRefresh"]
+        self.assertEqual(len(refreshes), 1)
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")])
+
+
+class ListingIndexTest(TestCase):
+    def test_listings_use_index_order(self):
+        call_command(
+            "seed_benchmark",
+            orders=300, branches=2, requisitions=2, products=5, items=2, stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command("explain_listing_queries", stdout=out)  # CommandError se houver sort/scan
+        self.assertNotIn("✗", out.getvalue())
+
+    def test_sort_nodes_are_detected(self):
+        from core.management.commands.explain_listing_queries import sorts
+
+        self.assertTrue(sorts("46 0 0 USE TEMP B-TREE FOR ORDER BY"))
+        self.assertTrue(sorts("Limit\n  ->  Sort  (cost=1.0..2.0 rows=1)\n"))
+        self.assertFalse(sorts("SEARCH requisicoes_order USING INDEX order_dest_created_idx"))
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_and_run_benchmark(self):
+        call_command(
+            "seed_benchmark",
+            orders=40, branches=2, requisitions=3, products=5, items=3, stdout=StringIO(),
+        )
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertTrue(OrderItem.objects.exists())
+        self.assertGreaterEqual(OrderStatusHistory.objects.count(), 40)
+
+        Order.objects.filter(id__in=Order.objects.values("id")[:5]).update(status=Order.Status.CRIADO)
+        before = Order.objects.count()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.json")
+            call_command(
+                "run_benchmark", iterations=3, cart_lines=4, json_path=path, stdout=StringIO(),
+            )
+            with open(path, encoding="utf-8") as fh:
+                report = json.load(fh)
+
+        self.assertEqual(
+            set(report["views"]),
+            {"requisition_list", "cart_view", "cart_submit", "admin_home", "user_orders", "advance_status"},
+        )
+        for result in report["views"].values():
+            self.assertGreater(result["queries_max"], 0)
+            self.assertGreaterEqual(result["p95_ms"], result["p50_ms"])
+
+        # sem --keep o benchmark não deixa pedidos novos no banco
+        self.assertEqual(Order.objects.count(), before)
+
+
+class QueryInstrumentationTest(TestCase):
+    def setUp(self):
+        austin = Location.objects.create(name="Austin")
+        self.user = User.objects.create_user("austin", is_staff=True)
+        self.user.profile.location = austin
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_stats_flag_repeated_sql(self):
+        from requisicoes.perf import QueryStats
+
+        stats = QueryStats()
+        execute = lambda sql, params, many, context: None
+        for pk in range(6):
+            stats(execute, "SELECT * FROM t WHERE id = %s", [pk], False, {})
+        stats(execute, "SELECT 1", [], False, {})
+
+        self.assertEqual(stats.count, 7)
+        self.assertEqual(stats.duplicates(), [{"count": 6, "sql": "SELECT * FROM t WHERE id = %s"}])
+        self.assertEqual(len(stats.slowest(limit=2)), 2)
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_off_by_default(self):
+        response = self.client.get("/xodo-admin/", secure=True)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(PERF_INSTRUMENTATION=True, PERF_RING_SIZE=10)
+    def test_header_log_and_dashboard(self):
+        with self.assertLogs("requisicoes.perf", "INFO") as logs:
+            response = self.client.get("/xodo-admin/", secure=True)
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries"')
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry["view"], entry["status"]), ("admin_home", 200))
+
+        with self.assertLogs("requisicoes.perf", "INFO"):
+            dashboard = self.client.get("/xodo-admin/perf/", secure=True)
+        self.assertContains(dashboard, "/xodo-admin/")
+
+
+class OrderEventsModeTest(TestCase):
+    def setUp(self):
+        austin = Location.objects.create(name="Austin")
+        self.user = User.objects.create_user("austin", password="x")
+        self.user.profile.location = austin
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    @override_settings(SERVER_MODE="wsgi")
+    def test_wsgi_returns_immediately_without_stream(self):
+        response = self.client.get("/xodo-admin/eventos/", secure=True)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+
+        board = self.client.get("/xodo-admin/", secure=True)
+        self.assertNotContains(board, "EventSource(")
+
+    @override_settings(SERVER_MODE="asgi")
+    def test_asgi_board_opens_event_source(self):
+        board = self.client.get("/xodo-admin/", secure=True)
+        self.assertContains(board, "EventSource(")
+
+
+class OrderEventsTest(TestCase):
+    def setUp(self):
+        create_branches(self)
+        self.product = Product.objects.create(
+            requisition=Requisition.objects.create(name="Limpeza"), name="Sabão",
+        )
+
+    def _subscribe(self, location):
+        """
+        Assina o canal da filial num loop em outra thread (como um worker
+        ASGI). Devolve uma função que espera o próximo evento.
+        """
+        from requisicoes.events import get_broadcaster, location_channel
+
+        broadcaster = get_broadcaster()
+        channel = location_channel(location.id)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        events = broadcaster.subscribe(channel)
+        before = broadcaster.subscriber_count(channel)
+        pending = asyncio.run_coroutine_threadsafe(anext(events), loop)
+        while broadcaster.subscriber_count(channel) == before:
+            time.sleep(0.01)
+
+        def cleanup():
+            pending.cancel()
+            asyncio.run_coroutine_threadsafe(events.aclose(), loop).result(timeout=2)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=2)
+            loop.close()
+
+        self.addCleanup(cleanup)
+        return lambda: pending.result(timeout=2)
+
+    def test_local_broadcaster_publish_subscribe(self):
+        from requisicoes.events import LocalBroadcaster
+
+        broadcaster = LocalBroadcaster()
+
+        async def scenario():
+            events = broadcaster.subscribe("location:1", keepalive=0.01)
+            first = asyncio.ensure_future(anext(events))
+            await asyncio.sleep(0)
+            self.assertEqual(broadcaster.subscriber_count("location:1"), 1)
+            broadcaster.publish("location:2", {"id": 2})
+            broadcaster.publish("location:1", {"id": 1})
+            received = [await first, await anext(events)]
+            await events.aclose()
+            return received
+
+        # evento do próprio canal e, sem mais nada, o keepalive (None)
+        self.assertEqual(asyncio.run(scenario()), [{"id": 1}, None])
+        self.assertEqual(broadcaster.subscriber_count("location:1"), 0)
+
+    def test_cart_submit_publishes_after_commit(self):
+        self.client.force_login(self.user)
+        self.client.post(f"/lista/add/{self.product.id}/", {"quantity": 2}, secure=True)
+        next_event = self._subscribe(self.austin)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/lista/enviar/", secure=True)
+
+        order = Order.objects.get()
+        self.assertEqual(next_event(), {
+            "type": "order.created", "id": order.id,
+            "status": "CRIADO", "status_label": "Criado",
+        })
+
+    def test_advance_status_publishes_to_origin(self):
+        order = create_order(self)
+        self.client.force_login(self.admin)
+        next_event = self._subscribe(self.queimados)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/xodo-admin/avancar/{order.id}/", secure=True)
+
+        self.assertEqual(next_event(), {
+            "type": "order.status", "id": order.id,
+            "status": "RECEBIDO_DESTINO", "status_label": "Recebido no destino",
+        })
+
+    def test_confirmar_recebimento_publishes_to_destination(self):
+        order = create_order(self, status=Order.Status.ENVIADO)
+        self.client.force_login(self.user)
+        next_event = self._subscribe(self.austin)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/confirmar-recebimento/{order.id}/", secure=True)
+
+        self.assertEqual(next_event(), {
+            "type": "order.status", "id": order.id,
+            "status": "RECEBIDO_ORIGEM", "status_label": "Recebido na origem",
+        })
+
+    def test_order_card_respects_branch(self):
+        order = create_order(self)
+        other = create_order(self, destination=Location.objects.create(name="Outra"))
+        self.client.force_login(self.admin)
+
+        card = self.client.get(f"/xodo-admin/pedidos/{order.id}/card/", secure=True)
+        self.assertContains(card, f'data-order-id="{order.id}"')
+        self.assertContains(card, "csrfmiddlewaretoken")
+        foreign = self.client.get(f"/xodo-admin/pedidos/{other.id}/card/", secure=True)
+        self.assertEqual(foreign.status_code, 404)
+
+        self.client.force_login(self.user)
+        denied = self.client.get(f"/xodo-admin/pedidos/{order.id}/card/", secure=True)
+        self.assertEqual(denied.status_code, 403)
+
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from requisicoes.cart import submit_cart
+
+        create_branches(cls)
+        cls.requisition = Requisition.objects.create(name="Limpeza")
+        product = Product.objects.create(requisition=cls.requisition, name="Sabão")
+        for _ in range(3):
+            submit_cart({str(product.id): 2}, cls.user, cls.queimados.id, cls.austin.id)
+
+    async def _client(self, user=None):
+        from django.test import AsyncClient
+
+        client = AsyncClient()
+        if user is not None:
+            await client.aforce_login(user)
+        return client
+
+    async def test_queimados_pages(self):
+        client = await self._client(self.user)
+        listing = await client.get("/requisicoes/", secure=True)
+        self.assertContains(listing, "Limpeza")
+        detail = await client.get(f"/requisition/{self.requisition.id}/", secure=True)
+        self.assertContains(detail, "Sabão")
+        missing = await client.get("/requisition/999999/", secure=True)
+        self.assertEqual(missing.status_code, 404)
+        orders = await client.get("/meus-pedidos/", secure=True)
+        self.assertContains(orders, "Pedido #")
+        board = await client.get("/xodo-admin/", secure=True)
+        self.assertEqual(board.status_code, 403)
+
+    async def test_austin_board_and_redirects(self):
+        client = await self._client(self.admin)
+        board = await client.get("/xodo-admin/", secure=True)
+        self.assertEqual(board.content.count(b"Pedido #"), 3)
+        listing = await client.get("/requisicoes/", secure=True)
+        self.assertEqual(listing.status_code, 302)
+
+        anonymous = await (await self._client()).get("/xodo-admin/", secure=True)
+        self.assertEqual(anonymous.status_code, 302)
+        self.assertTrue(anonymous["Location"].startswith("/login/"))
+
+
+class PendingCounterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_branches(self)
+
+    def test_count_cached_after_first_read(self):
+        from requisicoes.pending import pending_count
+
+        create_order(self)
+        create_order(self, Order.Status.ENVIADO)
+        with self.assertNumQueries(1):
+            self.assertEqual(pending_count(self.austin.id), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(pending_count(self.austin.id), 1)
+            self.assertEqual(pending_count(None), 0)
+
+    def test_incr_and_decr_after_commit(self):
+        from requisicoes.pending import pending_count, record_transition
+
+        S = Order.Status
+        self.assertEqual(pending_count(self.austin.id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record_transition(self.austin.id, None, S.CRIADO, count=3)
+        # pendente -> pendente não mexe; saiu do destino desconta
+        with self.captureOnCommitCallbacks(execute=True):
+            record_transition(self.austin.id, S.CRIADO, S.SEPARANDO)
+            record_transition(self.austin.id, S.SEPARANDO, S.ENVIADO, count=2)
+        with self.assertNumQueries(0):
+            self.assertEqual(pending_count(self.austin.id), 1)
+
+        # sem commit (rollback) o cache fica como estava
+        with self.captureOnCommitCallbacks(execute=False):
+            record_transition(self.austin.id, None, S.CRIADO)
+        self.assertEqual(pending_count(self.austin.id), 1)
+
+    def test_adjust_without_key_waits_for_recount(self):
+        from requisicoes.pending import pending_count, record_transition
+
+        create_order(self)
+        create_order(self)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_transition(self.austin.id, Order.Status.CRIADO, Order.Status.ENVIADO)
+        self.assertEqual(pending_count(self.austin.id), 2)
+
+    def test_recount_after_transition_is_not_adjusted_again(self):
+        from requisicoes.pending import pending_count, record_transition
+
+        create_order(self)
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_order(self)
+            record_transition(self.austin.id, None, Order.Status.CRIADO)
+            # miss no meio: o COUNT já vê o pedido novo
+            self.assertEqual(pending_count(self.austin.id), 2)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(pending_count(self.austin.id), 2)
+
+
+class BulkAdvanceTest(TestCase):
+    def setUp(self):
+        self.austin = Location.objects.create(name="Austin")
+        origin = Location.objects.create(name="Queimados")
+        self.user = User.objects.create_user("a")
+        self.orders = [
+            Order.objects.create(
+                created_by=self.user, origin_location=origin, destination_location=self.austin,
+            )
+            for _ in range(3)
+        ]
+
+    def test_skips_wrong_status_and_other_branches(self):
+        from requisicoes.transitions import bulk_advance
+
+        ids = [o.id for o in self.orders]
+        Order.objects.filter(id=ids[2]).update(status=Order.Status.SEPARANDO)
+        result = bulk_advance(ids + [999], Order.Status.RECEBIDO_DESTINO, self.user, self.austin.id)
+
+        self.assertEqual(result.updated, ids[:2])
+        self.assertEqual(set(result.skipped), {ids[2], 999})
+        self.assertEqual(OrderStatusHistory.objects.filter(status="RECEBIDO_DESTINO").count(), 2)
+
+    def test_orders_moved_concurrently_get_no_history(self):
+        from unittest import mock
+
+        from django.utils import timezone
+
+        from requisicoes import transitions
+
+        ids = [o.id for o in self.orders]
+        real_now = timezone.now
+
+        def race():
+            # outro usuário avança o pedido entre a leitura e o UPDATE do lote
+            Order.objects.filter(id=ids[0]).update(
+                status=Order.Status.RECEBIDO_DESTINO, status_changed_at=real_now()
+            )
+            return real_now()
+
+        with mock.patch.object(transitions.timezone, "now", side_effect=race), \
+                mock.patch.object(transitions, "record_transition") as record:
+            result = transitions.bulk_advance(
+                ids, Order.Status.RECEBIDO_DESTINO, self.user, self.austin.id
+            )
+
+        self.assertEqual(result.updated, ids[1:])
+        self.assertIn(ids[0], result.skipped)
+        self.assertFalse(OrderStatusHistory.objects.filter(order_id=ids[0]).exists())
+        self.assertEqual(record.call_args.kwargs["count"], 2)
+
+    def test_pdf_cache_invalidated_in_one_pass(self):
+        from requisicoes.pdf import invalidate_order_pdfs
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(PDF_CACHE_DIR=tmp):
+            for name in ("order-1-10.pdf", "order-1-11.pdf", "order-12-10.pdf", "order-2-10.pdf"):
+                open(os.path.join(tmp, name), "wb").close()
+            invalidate_order_pdfs([1, 2])
+            self.assertEqual(os.listdir(tmp), ["order-12-10.pdf"])
+
+
+@skipIf(
+    connection.vendor == "sqlite" and not connection.settings_dict["TEST"]["NAME"],
+    "SQLite em memória falha na hora em vez de esperar o lock: rode com TEST_DB_NAME",
+)
+class ConcurrentTransitionTest(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user("operador")
+        origin = Location.objects.create(name="Queimados")
+        destination = Location.objects.create(name="Austin")
+        self.order = Order.objects.create(
+            created_by=self.user, origin_location=origin, destination_location=destination,
+        )
+
+    def _hammer(self):
+        """
+        THREADS operadores leem o mesmo pedido e clicam "avançar" juntos.
+        """
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        lock = threading.Lock()
+
+        def click():
+            try:
+                order = Order.objects.get(pk=self.order.pk)
+                barrier.wait()
+                try:
+                    advance(order, self.user, DESTINATION)
+                    outcome = "ok"
+                except TransitionConflict:
+                    outcome = "conflict"
+                with lock:
+                    outcomes.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return outcomes
+
+    def test_one_history_row_per_transition(self):
+        for expected in (Order.Status.RECEBIDO_DESTINO, Order.Status.SEPARANDO, Order.Status.ENVIADO):
+            outcomes = self._hammer()
+            self.assertEqual(outcomes.count("ok"), 1)
+            self.assertEqual(outcomes.count("conflict"), self.THREADS - 1)
+
+            self.order.refresh_from_db()
+            self.assertEqual(self.order.status, expected)
+            self.assertEqual(
+                OrderStatusHistory.objects.filter(order=self.order, status=expected).count(), 1
+            )
+
+
+class CookieCartStoreTest(TestCase):
+    def setUp(self):
+        queimados = Location.objects.create(name="Queimados")
+        self.user = User.objects.create_user("queimados", password="x")
+        self.user.profile.location = queimados
+        self.user.profile.save()
+        req = Requisition.objects.create(name="Limpeza")
+        self.products = [
+            Product.objects.create(requisition=req, name=f"Produto {i}") for i in range(3)
+        ]
+        self.client.force_login(self.user)
+
+    def _store(self, user, cookies=None):
+        from django.test import RequestFactory
+
+        from requisicoes.cart_store import CookieCartStore
+
+        request = RequestFactory().get("/")
+        request.user = user
+        request.COOKIES.update(cookies or {})
+        return CookieCartStore(request)
+
+    def test_codec(self):
+        from requisicoes.cart_store import decode_cart, encode_cart
+
+        self.assertEqual(decode_cart(encode_cart({1: 2, 30: 4})), {1: 2, 30: 4})
+        self.assertEqual(decode_cart("1-2.x-3.4-0.5"), {1: 2})
+        self.assertEqual(decode_cart(None), {})
+
+    def test_signed_per_user(self):
+        from django.http import HttpResponse
+
+        from requisicoes.cart_store import COOKIE_NAME
+
+        store = self._store(self.user)
+        store.add(12, 3)
+        response = HttpResponse()
+        store.save(response)
+        cookie = {COOKIE_NAME: response.cookies[COOKIE_NAME].value}
+
+        self.assertEqual(self._store(self.user, cookie).as_dict(), {12: 3})
+        # outro login no mesmo navegador não herda o carrinho
+        other = User.objects.create_user("outro")
+        self.assertEqual(self._store(other, cookie).as_dict(), {})
+        # valor adulterado é ignorado
+        tampered = {COOKIE_NAME: cookie[COOKIE_NAME].replace("12-3", "12-9")}
+        self.assertEqual(self._store(self.user, tampered).as_dict(), {})
+
+    def test_size_capped(self):
+        from requisicoes.cart_store import COOKIE_MAX_BYTES, CartFull, encode_cart
+
+        store = self._store(self.user)
+        with self.assertRaises(CartFull):
+            for pid in range(1, 10_000):
+                store.add(pid, 1)
+        self.assertLessEqual(len(encode_cart(store.lines)), COOKIE_MAX_BYTES)
+        full = store.as_dict()
+
+        with self.assertRaises(CartFull):
+            store.set(1, 10 ** 3000)
+        self.assertEqual(store.as_dict(), full)
+
+    def test_full_cart_warns_in_views(self):
+        from unittest import mock
+
+        from django.urls import reverse
+
+        from requisicoes.cart_store import CookieCartStore
+
+        first, second, third = (p.id for p in self.products)
+        with mock.patch.object(CookieCartStore, "max_bytes", len(f"{first}-1")):
+            self.client.post(reverse("cart_add", args=[first]), {"quantity": 1}, secure=True)
+            response = self.client.post(
+                reverse("cart_add", args=[second]), {"quantity": 1}, secure=True, follow=True,
+            )
+            self.assertContains(response, "Carrinho cheio")
+
+            batch = self.client.post(
+                reverse("cart_batch"),
+                json.dumps({"ops": [{"op": "add", "product": third, "quantity": 1}]}),
+                content_type="application/json", secure=True,
+            ).json()
+        self.assertEqual(batch["line_count"], 1)
+        self.assertIn("Carrinho cheio", batch["errors"][0]["error"])
+
+
+class CartBatchTest(TestCase):
+    def setUp(self):
+        create_branches(self)
+        req = Requisition.objects.create(name="Limpeza")
+        self.ids = [Product.objects.create(requisition=req, name=f"P{i}").id for i in range(3)]
+
+    def _store(self):
+        from django.test import RequestFactory
+
+        from requisicoes.cart_store import CookieCartStore
+
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return CookieCartStore(request)
+
+    def test_apply_batch_validates_products_in_one_query(self):
+        from requisicoes.cart_store import apply_batch, cart_summary
+
+        p0, p1, _ = self.ids
+        store = self._store()
+        with self.assertNumQueries(1):
+            touched, errors = apply_batch(store, [
+                {"op": "add", "product": p0, "quantity": 2},
+                {"op": "add", "product": p0, "quantity": 3},
+                {"op": "set", "product": p1, "quantity": 4},
+                {"op": "add", "product": 999999, "quantity": 1},
+                {"op": "bogus"},
+                {"op": "set", "product": "x"},
+            ])
+        self.assertEqual(touched, [p0, p1])
+        self.assertEqual([e["index"] for e in errors], [4, 5, 3])
+        self.assertEqual(cart_summary(store, touched), {
+            "lines": [{"product": p0, "quantity": 5}, {"product": p1, "quantity": 4}],
+            "line_count": 2,
+            "total_quantity": 9,
+        })
+
+        # só remove/clear: nada pra validar no banco
+        with self.assertNumQueries(0):
+            touched, errors = apply_batch(store, [{"op": "remove", "product": p1}, {"op": "clear"}])
+        self.assertEqual((touched, errors), ([p1, p0], []))
+        self.assertEqual(len(store), 0)
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        ops = {"ops": [{"op": "add", "product": self.ids[2], "quantity": 1}]}
+        response = self.client.post(
+            "/lista/lote/", json.dumps(ops), content_type="application/json", secure=True,
+        )
+        self.assertEqual(response.json()["line_count"], 1)
+        self.assertIn("xodo_cart", response.cookies)
+
+        bad = self.client.post("/lista/lote/", "nope", content_type="application/json", secure=True)
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(self.client.get("/lista/lote/", secure=True).status_code, 405)
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        req = Requisition.objects.create(name="Limpeza")
+        Product.objects.create(requisition=req, name="Sabão em Pó")
+        Product.objects.create(requisition=req, name="Detergente")
+        self.req = req
+
+    def test_fold(self):
+        from requisicoes.search import fold
+
+        self.assertEqual(fold("Sabão em Pó!"), "sabao em po")
+        self.assertEqual(fold(None), "")
+
+    def test_prefix_and_typo(self):
+        from requisicoes.search import MemorySearchBackend
+
+        backend = MemorySearchBackend()
+        self.assertEqual([r["name"] for r in backend.search("SABAO")], ["Sabão em Pó"])
+        self.assertEqual([r["name"] for r in backend.search("deter")], ["Detergente"])
+        self.assertEqual([r["name"] for r in backend.search("detergnte")], ["Detergente"])
+        self.assertEqual([r["name"] for r in backend.search("limp po")], ["Sabão em Pó"])
+        self.assertEqual(backend.search("   "), [])
+
+    def test_index_rebuilt_after_ttl(self):
+        from requisicoes.search import MemorySearchBackend
+
+        backend = MemorySearchBackend()
+        self.assertEqual(backend.search("amaciante"), [])
+        # bulk_create não passa pelos signals: é o caso de outro worker
+        # ter mudado o catálogo sem este processo ver a versão nova
+        Product.objects.bulk_create([Product(requisition=self.req, name="Amaciante")])
+
+        with override_settings(SEARCH_INDEX_TTL=3600):
+            self.assertEqual(backend.search("amaciante"), [])
+        with override_settings(SEARCH_INDEX_TTL=0):
+            self.assertEqual([r["name"] for r in backend.search("amaciante")], ["Amaciante"])
+
+    def test_backend_from_settings(self):
+        from unittest import mock
+
+        from requisicoes.search import (
+            MemorySearchBackend, TrigramSearchBackend, get_search_backend, uses_trigram_backend,
+        )
+
+        self.assertFalse(uses_trigram_backend())
+        with mock.patch("requisicoes.search._backend", None):
+            self.assertIsInstance(get_search_backend(), MemorySearchBackend)
+
+        trigram = "requisicoes.search.TrigramSearchBackend"
+        with override_settings(SEARCH_BACKEND=trigram), mock.patch("requisicoes.search._backend", None):
+            self.assertTrue(uses_trigram_backend())
+            self.assertIsInstance(get_search_backend(), TrigramSearchBackend)
+
+    @override_settings(SEARCH_BACKEND="requisicoes.search.MemorySearchBackend")
+    def test_product_search_view(self):
+        from unittest import mock
+
+        create_branches(self)
+        self.client.force_login(self.user)
+        url = "/busca/"
+        with mock.patch("requisicoes.search._backend", None):
+            page = self.client.get(url, {"q": "sabao"}, secure=True)
+            data = self.client.get(url, {"q": "deter"}, secure=True, HTTP_ACCEPT="application/json").json()
+            empty = self.client.get(url, secure=True)
+
+        self.assertContains(page, "Sabão em Pó")
+        self.assertNotContains(page, "Detergente")
+        self.assertEqual(data["query"], "deter")
+        self.assertEqual([r["name"] for r in data["results"]], ["Detergente"])
+        self.assertEqual(empty.context["results"], [])
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(url, {"q": "sabao"}, secure=True).status_code, 302)
+
+
+class OrderCardCacheTest(TestCase):
+    def setUp(self):
+        from requisicoes.cart import submit_cart
+
+        cache.clear()
+        create_branches(self)
+        product = Product.objects.create(requisition=Requisition.objects.create(name="R"), name="Sabão")
+        self.ids = [
+            submit_cart({str(product.id): n}, self.user, self.queimados.id, self.austin.id)[0].id
+            for n in (1, 2, 3)
+        ]
+
+    def _cards(self):
+        from requisicoes.orders import ADMIN_CARD, order_cards, order_listing_queryset
+
+        orders = list(order_listing_queryset(with_items=False).order_by("id"))
+        return order_cards(ADMIN_CARD, orders)
+
+    def test_items_only_for_cards_not_cached(self):
+        from requisicoes.orders import bump_order_version
+
+        with self.assertNumQueries(2):  # pedidos + itens de todos
+            first = self._cards()
+        with self.assertNumQueries(1):  # só os pedidos
+            self.assertEqual(self._cards(), first)
+
+        bump_order_version(id=self.ids[0])
+        with CaptureQueriesContext(connection) as ctx:
+            self._cards()
+        self.assertEqual(len(ctx), 2)
+        self.assertIn(f"IN ({self.ids[0]})", ctx.captured_queries[1]["sql"])
+
+    def test_item_edit_invalidates_card(self):
+        self._cards()
+        item = OrderItem.objects.get(order_id=self.ids[1])
+        item.quantity = 77
+        item.save()
+        self.assertIn("Quantidade: 77", self._cards())
+
+    def test_product_rename_invalidates_cards(self):
+        self._cards()
+        product = Product.objects.get()
+        product.name = "Detergente"
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        html = self._cards()
+        self.assertNotIn("Sabão", html)
+        self.assertEqual(html.count("Detergente"), 3)
+
+    def test_csrf_token_filled_per_request(self):
+        from django.test import RequestFactory
+
+        from requisicoes.fragments import CSRF_PLACEHOLDER, with_csrf
+
+        html = self._cards()
+        self.assertIn(CSRF_PLACEHOLDER, html)
+        served = with_csrf(html, RequestFactory().get("/"))
+        self.assertNotIn(CSRF_PLACEHOLDER, served)
+
+
+class ThumbnailTest(TestCase):
+    def test_thumbnails_generated_on_save_and_backfill(self):
+        from django.core.files.base import ContentFile
+        from django.test import override_settings
+        from PIL import Image
+
+        from requisicoes.catalog import build_requisitions_snapshot
+
+        buf = BytesIO()
+        Image.new("RGB", (400, 200), "red").save(buf, format="PNG")
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+            MEDIA_ROOT=tmp,
+            MEDIA_URL_RESOLVER="requisicoes.media_urls.PrefixURLResolver",
+            MEDIA_URL_PREFIX="https://cdn.example/m/",
+            THUMBNAIL_HEIGHTS=(80, 160),
+        ):
+            req = Requisition(name="Limpeza")
+            req.icon.save("icone.png", ContentFile(buf.getvalue()), save=False)
+            with self.captureOnCommitCallbacks(execute=True):
+                req.save()
+
+            req.refresh_from_db()
+            self.assertEqual(req.thumbnails["icon"]["source"], req.icon.name)
+            webp = req.thumbnails["icon"]["webp"]["80"]
+            with Image.open(os.path.join(tmp, webp)) as thumb:
+                self.assertEqual((thumb.format, thumb.size), ("WEBP", (160, 80)))
+
+            # URLs resolvidas ao salvar: o snapshot da listagem só lê o banco
+            self.assertEqual(req.media_urls["icon"], f"https://cdn.example/m/{req.icon.name}")
+            self.assertIn(f"https://cdn.example/m/{webp} 1x", req.media_urls["thumb"]["webp"])
+            row = build_requisitions_snapshot()[0]
+            self.assertEqual(row["thumb"], req.media_urls["thumb"])
+
+            out = StringIO()
+            call_command("generate_thumbnails", workers=2, stdout=out)
+            self.assertIn("0 de 1", out.getvalue())
+            call_command("generate_thumbnails", workers=2, force=True, stdout=out)
+            self.assertIn("1 de 1", out.getvalue())
+
+
+class PrefixedStorage(FileSystemStorage):
+    """
+    Disco com o mesmo prefixo de nome do MediaCloudinaryStorage.
+    """
+
+    def _prepend_prefix(self, name):
+        return name if name.startswith("media/") else f"media/{name}"
+
+    def _save(self, name, content):
+        return super()._save(self._prepend_prefix(name), content)
+
+
+class CleanOldMediaTest(TestCase):
+    def _storages(self, backend):
+        return {
+            "default": {"BACKEND": backend},
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+
+    def _touch(self, root, name):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        return path
+
+    def test_stale_prefixes_dry_run_then_cleared(self):
+        req = Requisition.objects.create(name="Antiga")
+        Requisition.objects.filter(pk=req.pk).update(icon="icons/x.png", image="products/y.png")
+
+        out = StringIO()
+        call_command("clean_old_media", dry_run=True, stdout=out)
+        self.assertIn("2 referências antigas seriam limpas", out.getvalue())
+        req.refresh_from_db()
+        self.assertEqual(req.icon.name, "icons/x.png")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("clean_old_media", stdout=StringIO())
+        req.refresh_from_db()
+        self.assertFalse(req.icon)
+        self.assertFalse(req.image)
+        self.assertEqual(req.media_urls, {"icon": "", "image": "", "thumb": None})
+
+    def test_orphans_under_storage_prefix(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            MEDIA_ROOT=tmp, STORAGES=self._storages("core.tests.PrefixedStorage"),
+        ):
+            kept = self._touch(tmp, "media/requisitions/icons/kept.png")
+            legacy = self._touch(tmp, "media/requisitions/icons/legacy.png")
+            orphan = self._touch(tmp, "media/requisitions/icons/orphan.png")
+            req = Requisition.objects.create(name="R")
+            # nome gravado pelo storage (com prefixo) e um antigo, sem
+            Requisition.objects.filter(pk=req.pk).update(
+                icon="media/requisitions/icons/kept.png", image="requisitions/icons/legacy.png",
+            )
+
+            out = StringIO()
+            call_command("clean_old_media", orphans=True, dry_run=True, stdout=out)
+            self.assertIn("órfão: media/requisitions/icons/orphan.png", out.getvalue())
+            self.assertIn("1 órfãos", out.getvalue())
+            self.assertTrue(os.path.exists(orphan))
+
+            call_command("clean_old_media", delete_orphans=True, chunk_size=1, stdout=StringIO())
+            self.assertFalse(os.path.exists(orphan))
+            self.assertTrue(os.path.exists(kept))
+            self.assertTrue(os.path.exists(legacy))
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        cache.clear()
+        create_branches(self)
+        self.start = timezone.now() - timedelta(days=2)
+
+        S = Order.Status
+        self.done = self._order([
+            (S.CRIADO, 0), (S.RECEBIDO_DESTINO, 60), (S.SEPARANDO, 3660),
+            (S.ENVIADO, 7260), (S.RECEBIDO_ORIGEM, 90060),
+        ])
+        self.open = self._order([(S.CRIADO, 0), (S.RECEBIDO_DESTINO, 600)])
+
+    def _order(self, steps):
+        from datetime import timedelta
+
+        order = create_order(self, status=steps[-1][0])
+        for status, offset in steps:
+            entry = OrderStatusHistory.objects.create(order=order, status=status, changed_by=self.user)
+            OrderStatusHistory.objects.filter(pk=entry.pk).update(
+                changed_at=self.start + timedelta(seconds=offset)
+            )
+        return order
+
+    def test_format_duration(self):
+        from requisicoes.timeline import format_duration
+
+        self.assertEqual(format_duration(59), "0min")
+        self.assertEqual(format_duration(3725), "1h 02min")
+        self.assertEqual(format_duration(90000), "1d 01h")
+
+    def test_steps_from_lag_and_lead(self):
+        from datetime import timedelta
+
+        from requisicoes.timeline import build_timelines
+
+        now = self.start + timedelta(days=1)
+        with self.assertNumQueries(1):
+            timelines = build_timelines([self.done, self.open], now=now)
+
+        done = timelines[self.done.id]
+        self.assertEqual(
+            [(s["from_status"], s["status"], s["seconds"]) for s in done["steps"]],
+            [
+                (None, "CRIADO", 60),
+                ("CRIADO", "RECEBIDO_DESTINO", 3600),
+                ("RECEBIDO_DESTINO", "SEPARANDO", 3600),
+                ("SEPARANDO", "ENVIADO", 82800),
+                ("ENVIADO", "RECEBIDO_ORIGEM", 0),
+            ],
+        )
+        self.assertEqual((done["lead_seconds"], done["lead_time"]), (90060, "1d 01h"))
+
+        current = timelines[self.open.id]["steps"][-1]
+        self.assertTrue(current["open"])
+        self.assertEqual(current["seconds"], 86400 - 600)
+        self.assertIsNone(timelines[self.open.id]["lead_seconds"])
+
+    def test_only_finished_orders_cached(self):
+        from requisicoes.timeline import order_timelines
+
+        orders = [self.done, self.open]
+        with self.assertNumQueries(1):
+            first = order_timelines(orders)
+        with CaptureQueriesContext(connection) as ctx:
+            again = order_timelines(orders)
+        self.assertEqual(len(ctx), 1)
+        self.assertIn(f"IN ({self.open.id})", ctx.captured_queries[0]["sql"])
+        self.assertEqual([t["order"] for t in again], [self.done.id, self.open.id])
+        self.assertEqual(again[0], first[0])
+
+
+class RollupTest(TestCase):
+    def test_incremental_rollups_match_live_aggregates(self):
+        from django.db.models import Sum
+
+        from requisicoes.models import DailyProductRollup, DailyTransitionRollup
+        from requisicoes.rollups import dashboard_data
+
+        call_command(
+            "seed_benchmark",
+            orders=30, branches=2, requisitions=2, products=4, items=3, stdout=StringIO(),
+        )
+        call_command("update_rollups", settle_seconds=0, batch_size=7, stdout=StringIO())
+
+        self.assertEqual(
+            DailyTransitionRollup.objects.aggregate(n=Sum("count"))["n"],
+            OrderStatusHistory.objects.count(),
+        )
+        self.assertEqual(
+            DailyProductRollup.objects.aggregate(n=Sum("quantity"))["n"],
+            OrderItem.objects.aggregate(n=Sum("quantity"))["n"],
+        )
+
+        # só o histórico novo entra na próxima rodada
+        order = Order.objects.filter(status=Order.Status.CRIADO).first()
+        user = User.objects.first()
+        advance(order, user, DESTINATION)
+        out = StringIO()
+        call_command("update_rollups", settle_seconds=0, stdout=out)
+        self.assertIn("1 linhas", out.getvalue())
+
+        location_id = order.destination_location_id
+        with self.assertNumQueries(4):
+            data = dashboard_data(location_id, days=365)
+        self.assertEqual(
+            data["created"], Order.objects.filter(destination_location_id=location_id).count()
+        )
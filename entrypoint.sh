@@ -1,4 +1,11 @@
 #!/bin/bash
-python manage.py migrate
+# --fake-initial: as tabelas de requisicoes já existem em produção (criadas
+# antes da 0001_initial); a 0001 é marcada como aplicada e o resto roda normal
+python manage.py migrate --fake-initial
 python manage.py shell < create_admin.py
+
+# SERVER_MODE=asgi: workers uvicorn (views async + SSE do painel)
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn requisicoes.asgi:application -k uvicorn_worker.UvicornWorker
+fi
 gunicorn requisicoes.wsgi:application
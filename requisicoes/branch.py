@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+
+
+AUSTIN = "Austin"
+QUEIMADOS = "Queimados"
+
+
+@dataclass(frozen=True)
+class Branch:
+    """
+    Filial do usuário logado, resolvida uma vez por request
+    (ver BranchMiddleware). Imutável de propósito.
+    """
+    user_id: int = None
+    profile_id: int = None
+    location_id: int = None
+    location_name: str = None
+
+    @property
+    def has_location(self):
+        return self.location_id is not None
+
+    @property
+    def is_austin(self):
+        return self.location_name == AUSTIN
+
+    @property
+    def is_queimados(self):
+        return self.location_name == QUEIMADOS
+
+
+ANONYMOUS_BRANCH = Branch()
+
+
+def branch_for_user(user):
+    """
+    Monta o Branch a partir do usuário. Com o BranchModelBackend o
+    profile e a location já vêm no mesmo SELECT do usuário.
+    """
+    if not user or not user.is_authenticated:
+        return ANONYMOUS_BRANCH
+
+    return _branch(user, getattr(user, "profile", None))
+
+
+async def abranch(request):
+    """
+    Versão async (views async): usa request.auser() e só vai ao banco
+    se o profile não veio junto com o usuário. Guarda o resultado em
+    request.user/request.branch pra templates não dispararem query síncrona.
+    """
+    from .models import UserProfile
+
+    user = await request.auser()
+    request.user = user
+
+    if not user.is_authenticated:
+        branch = ANONYMOUS_BRANCH
+    elif type(user).profile.is_cached(user):
+        branch = _branch(user, getattr(user, "profile", None))
+    else:
+        profile = await UserProfile.objects.select_related("location").filter(user_id=user.pk).afirst()
+        branch = _branch(user, profile)
+
+    request.branch = branch
+    return branch
+
+
+def _branch(user, profile):
+    if profile is None:
+        return Branch(user_id=user.pk)
+
+    location = profile.location
+    return Branch(
+        user_id=user.pk,
+        profile_id=profile.pk,
+        location_id=location.pk if location else None,
+        location_name=location.name if location else None,
+    )
@@ -0,0 +1,102 @@
+from django.db import transaction
+
+from .models import Order, OrderItem, OrderStatusHistory, Product
+from .pending import record_transition
+
+
+class CartError(Exception):
+    """
+    Carrinho não pode ser enviado (vazio ou só com produtos inválidos).
+    """
+
+
+# ======================================================
+# LEITURA DO CARRINHO (sessão: {"<product_id>": qty})
+# ======================================================
+def parse_cart(cart):
+    """
+    Normaliza o dict da sessão em {product_id: quantidade}, descartando
+    chaves/quantidades inválidas.
+    """
+    lines = {}
+    for pid_str, qty in (cart or {}).items():
+        try:
+            pid = int(pid_str)
+            q = int(qty)
+        except (ValueError, TypeError):
+            continue
+
+        if q > 0:
+            lines[pid] = q
+    return lines
+
+
+def load_products(product_ids):
+    """
+    Todos os produtos do carrinho em uma query só ({id: Product}).
+    """
+    if not product_ids:
+        return {}
+    return Product.objects.select_related("requisition").in_bulk(product_ids)
+
+
+def load_cart_items(cart):
+    """
+    Linhas prontas pro template, na ordem do carrinho. Produtos que não
+    existem mais são ignorados.
+    """
+    lines = parse_cart(cart)
+    products = load_products(list(lines))
+    return [
+        {"product": products[pid], "quantity": qty}
+        for pid, qty in lines.items()
+        if pid in products
+    ]
+
+
+# ======================================================
+# ENVIO
+# ======================================================
+@transaction.atomic
+def submit_cart(cart, user, origin_location_id, destination_location_id):
+    """
+    Cria o pedido, o histórico inicial e todos os itens de uma vez.
+    Devolve (pedido, ids descartados).
+
+    Tudo numa transação: ou o pedido entra inteiro ou não entra nada.
+    Ids de produto desconhecidos (produto apagado depois de ir pro
+    carrinho) são descartados com uma única query e devolvidos pra view
+    avisar o usuário.
+    """
+    lines = parse_cart(cart)
+    known = set(
+        Product.objects.filter(id__in=list(lines)).values_list("id", flat=True)
+    ) if lines else set()
+    dropped = [pid for pid in lines if pid not in known]
+    lines = {pid: qty for pid, qty in lines.items() if pid in known}
+
+    if not lines:
+        raise CartError("Carrinho vazio.")
+
+    order = Order.objects.create(
+        created_by=user,
+        origin_location_id=origin_location_id,
+        destination_location_id=destination_location_id,
+        status=Order.Status.CRIADO,
+        item_count=len(lines),
+        total_quantity=sum(lines.values()),
+    )
+
+    OrderStatusHistory.objects.create(
+        order=order,
+        status=order.status,
+        changed_by=user
+    )
+
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=pid, quantity=qty)
+        for pid, qty in lines.items()
+    ])
+
+    record_transition(destination_location_id, None, order.status)
+    return order, dropped
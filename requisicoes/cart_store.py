@@ -0,0 +1,267 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .cart import parse_cart
+from .models import Product
+
+
+COOKIE_NAME = "xodo_cart"
+SESSION_CART_KEY = "cart"  # onde o carrinho ficava antes (migração)
+
+# navegadores descartam cookie > 4096 bytes (nome + valor assinado)
+COOKIE_MAX_BYTES = 3500
+
+
+class CartFull(Exception):
+    """
+    A alteração não cabe no carrinho (limite do backend).
+    """
+
+
+# ======================================================
+# CODIFICAÇÃO COMPACTA: "12-3.45-1" = {12: 3, 45: 1}
+# ======================================================
+def encode_cart(lines):
+    return ".".join(f"{pid}-{qty}" for pid, qty in lines.items())
+
+
+def decode_cart(raw):
+    lines = {}
+    for chunk in (raw or "").split("."):
+        pid, _, qty = chunk.partition("-")
+        try:
+            pid, qty = int(pid), int(qty)
+        except ValueError:
+            continue
+        if qty > 0:
+            lines[pid] = qty
+    return lines
+
+
+# ======================================================
+# STORE
+# ======================================================
+class CartStore:
+    """
+    Carrinho fora da sessão ({product_id: quantidade}).
+
+    Carrega sob demanda, as views alteram linha a linha (add/set/remove)
+    e o CartMiddleware grava uma vez no fim da request, só se mudou.
+    Carrinho antigo em request.session["cart"] é importado na primeira
+    leitura e removido da sessão.
+    """
+
+    # tamanho máximo do carrinho codificado (None = sem limite)
+    max_bytes = None
+
+    def __init__(self, request):
+        self.request = request
+        self._lines = None
+        self.modified = False
+
+    # ---- leitura ----
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.load()
+            self._migrate_session_cart()
+        return self._lines
+
+    def as_dict(self):
+        return dict(self.lines)
+
+    def quantity(self, product_id):
+        return self.lines.get(product_id, 0)
+
+    def __len__(self):
+        return len(self.lines)
+
+    # ---- alterações parciais ----
+    def add(self, product_id, quantity):
+        if quantity > 0:
+            self.set(product_id, self.quantity(product_id) + quantity)
+
+    def set(self, product_id, quantity):
+        if quantity <= 0:
+            return self.remove(product_id)
+        previous = self.lines.get(product_id)
+        if previous == quantity:
+            return
+        self.lines[product_id] = quantity
+        if self.max_bytes and len(encode_cart(self.lines)) > self.max_bytes:
+            if previous is None:
+                del self.lines[product_id]
+            else:
+                self.lines[product_id] = previous
+            raise CartFull("Carrinho cheio: envie o pedido ou remova algum produto.")
+        self.modified = True
+
+    def remove(self, product_id):
+        if self.lines.pop(product_id, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self.lines:
+            self._lines = {}
+            self.modified = True
+
+    # ---- backend ----
+    def load(self):
+        raise NotImplementedError
+
+    def save(self, response):
+        raise NotImplementedError
+
+    def _migrate_session_cart(self):
+        session = getattr(self.request, "session", None)
+        if session is None or SESSION_CART_KEY not in session:
+            return
+        legacy = parse_cart(session.pop(SESSION_CART_KEY))
+        for pid, qty in legacy.items():
+            self._lines.setdefault(pid, qty)
+        self.modified = True
+
+    def _user_id(self):
+        user = getattr(self.request, "user", None)
+        return user.pk if user is not None and user.is_authenticated else None
+
+
+class CookieCartStore(CartStore):
+    """
+    Cookie assinado (salt por usuário: carrinho de outro login no mesmo
+    navegador não vale). Nenhum acesso a banco ou cache.
+
+    O valor fica limitado a COOKIE_MAX_BYTES: acima disso o navegador
+    descartaria o cookie inteiro em silêncio. add/set levantam CartFull.
+    """
+
+    max_bytes = COOKIE_MAX_BYTES
+
+    def _salt(self):
+        return f"xodo.cart.{self._user_id()}"
+
+    def load(self):
+        raw = self.request.get_signed_cookie(COOKIE_NAME, default="", salt=self._salt())
+        return decode_cart(raw)
+
+    def save(self, response):
+        if not self._lines:
+            response.delete_cookie(COOKIE_NAME, samesite="Lax")
+            return
+        value = encode_cart(self._lines)
+        if len(value) > self.max_bytes:
+            # só o carrinho antigo da sessão entra sem passar por set():
+            # corta as últimas linhas em vez de perder tudo
+            value = value[:self.max_bytes].rpartition(".")[0]
+        response.set_signed_cookie(
+            COOKIE_NAME,
+            value,
+            salt=self._salt(),
+            max_age=settings.SESSION_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+
+class CacheCartStore(CartStore):
+    """
+    Cache do Django, uma chave por usuário. Precisa de cache compartilhado
+    entre workers (CACHE_BACKEND=file ou similar).
+    """
+
+    def _key(self):
+        return f"cart:{self._user_id()}"
+
+    def load(self):
+        if self._user_id() is None:
+            return {}
+        return decode_cart(cache.get(self._key()))
+
+    def save(self, response):
+        if self._user_id() is None:
+            return
+        if self._lines:
+            cache.set(self._key(), encode_cart(self._lines), settings.SESSION_COOKIE_AGE)
+        else:
+            cache.delete(self._key())
+
+
+def get_cart_store(request):
+    backend = getattr(settings, "CART_STORE_BACKEND", "requisicoes.cart_store.CookieCartStore")
+    return import_string(backend)(request)
+
+
+# ======================================================
+# LOTE DE ALTERAÇÕES (endpoint JSON do carrinho)
+# ======================================================
+CART_OPS = ("add", "set", "remove", "clear")
+
+
+def apply_batch(store, ops):
+    """
+    Aplica, em ordem, uma lista de alterações no carrinho:
+    {"op": "add"|"set"|"remove"|"clear", "product": id, "quantity": n}.
+
+    Produtos de add/set são validados numa query só. Retorna
+    (ids de produto alterados, erros [{"index", "error"}]); entradas
+    inválidas são puladas, as outras são aplicadas mesmo assim.
+    """
+    parsed = []
+    errors = []
+    for index, entry in enumerate(ops):
+        if not isinstance(entry, dict) or entry.get("op") not in CART_OPS:
+            errors.append({"index": index, "error": "operação inválida"})
+            continue
+        op = entry["op"]
+        if op == "clear":
+            parsed.append((index, op, None, 0))
+            continue
+        try:
+            pid = int(entry.get("product"))
+            qty = int(entry.get("quantity", 0))
+        except (TypeError, ValueError):
+            errors.append({"index": index, "error": "produto/quantidade inválidos"})
+            continue
+        parsed.append((index, op, pid, qty))
+
+    wanted = {pid for _, op, pid, _ in parsed if op in ("add", "set")}
+    known = set(
+        Product.objects.filter(id__in=wanted).values_list("id", flat=True)
+    ) if wanted else set()
+
+    touched = []
+    for index, op, pid, qty in parsed:
+        if op == "clear":
+            touched.extend(store.lines)
+            store.clear()
+            continue
+        if op in ("add", "set") and pid not in known:
+            errors.append({"index": index, "error": "produto não existe"})
+            continue
+
+        try:
+            if op == "add":
+                store.add(pid, qty)
+            elif op == "set":
+                store.set(pid, qty)
+            else:
+                store.remove(pid)
+        except CartFull as exc:
+            errors.append({"index": index, "error": str(exc)})
+            continue
+        touched.append(pid)
+
+    return list(dict.fromkeys(touched)), errors
+
+
+def cart_summary(store, product_ids):
+    """
+    Quantidade atual das linhas pedidas (0 = saiu do carrinho) + totais.
+    """
+    return {
+        "lines": [{"product": pid, "quantity": store.quantity(pid)} for pid in product_ids],
+        "line_count": len(store),
+        "total_quantity": sum(store.lines.values()),
+    }
@@ -0,0 +1,196 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .fragments import render_fragment
+from .models import Product, Requisition
+
+
+VERSION_KEY = "catalog:version"
+
+
+# ======================================================
+# VERSÃO DO CATÁLOGO
+# ======================================================
+def catalog_version():
+    """
+    Versão atual do catálogo. Toda chave de snapshot inclui a versão,
+    então invalidar = trocar a versão (as chaves velhas expiram sozinhas).
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def invalidate_catalog():
+    # time_ns em vez de incr: se a chave sumir do cache, a versão nova
+    # nunca colide com snapshots antigos ainda guardados
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+async def acatalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(VERSION_KEY, version, timeout=None):
+            version = await cache.aget(VERSION_KEY, version)
+    return version
+
+
+def _key(*parts, version=None):
+    if version is None:
+        version = catalog_version()
+    return ":".join(["catalog", str(version), *map(str, parts)])
+
+
+def _timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+# ======================================================
+# SNAPSHOTS (dados puros, sem model instances)
+# ======================================================
+def _requisition_row(req):
+    # URLs gravadas ao salvar (media_urls.py): a listagem não toca no storage
+    urls = req.media_urls or {}
+    return {
+        "id": req.id,
+        "name": req.name,
+        "icon_url": urls.get("icon", ""),
+        "image_url": urls.get("image", ""),
+        "thumb": urls.get("thumb"),
+    }
+
+
+def _requisitions():
+    return Requisition.objects.only("id", "name", "media_urls").order_by("name")
+
+
+def build_requisitions_snapshot():
+    return [_requisition_row(req) for req in _requisitions()]
+
+
+def build_products_snapshot(requisition_id):
+    requisition = Requisition.objects.filter(id=requisition_id).values("id", "name").first()
+    if requisition is None:
+        return None
+
+    products = list(
+        Product.objects.filter(requisition_id=requisition_id)
+        .order_by("name")
+        .values("id", "name")
+    )
+    return {"requisition": requisition, "products": products}
+
+
+def requisitions_snapshot():
+    return cache.get_or_set(_key("requisitions"), build_requisitions_snapshot, _timeout())
+
+
+def products_snapshot(requisition_id):
+    """
+    None se a requisição não existe (também fica em cache, evita martelar
+    o banco com ids inválidos).
+    """
+    snapshot = cache.get_or_set(
+        _key("products", requisition_id),
+        lambda: build_products_snapshot(requisition_id) or {},
+        _timeout(),
+    )
+    return snapshot or None
+
+
+# ======================================================
+# FRAGMENTOS RENDERIZADOS
+# ======================================================
+def requisition_list_fragment():
+    return cache.get_or_set(
+        _key("fragment", "requisitions"),
+        lambda: render_fragment(
+            "user/_requisition_grid.html", {"requisitions": requisitions_snapshot()}
+        ),
+        _timeout(),
+    )
+
+
+def requisition_detail_fragment(requisition_id):
+    """
+    (requisição, html da tabela de produtos) ou None se não existe.
+    O html vem com o marcador de CSRF: servir com fragments.with_csrf.
+    """
+    snapshot = products_snapshot(requisition_id)
+    if snapshot is None:
+        return None
+
+    html = cache.get_or_set(
+        _key("fragment", "products", requisition_id),
+        lambda: render_fragment(
+            "user/_product_table.html", {"products": snapshot["products"]}
+        ),
+        _timeout(),
+    )
+    return snapshot["requisition"], html
+
+
+# ======================================================
+# VERSÕES ASYNC (views async: cache.aget/aset + ORM async)
+# ======================================================
+async def _aget_or_set(key, abuild):
+    value = await cache.aget(key)
+    if value is None:
+        value = await abuild()
+        await cache.aset(key, value, _timeout())
+    return value
+
+
+async def abuild_requisitions_snapshot():
+    return [_requisition_row(req) async for req in _requisitions()]
+
+
+async def abuild_products_snapshot(requisition_id):
+    requisition = await Requisition.objects.filter(id=requisition_id).values("id", "name").afirst()
+    if requisition is None:
+        return None
+
+    products = [
+        p async for p in
+        Product.objects.filter(requisition_id=requisition_id).order_by("name").values("id", "name")
+    ]
+    return {"requisition": requisition, "products": products}
+
+
+async def arequisition_list_fragment():
+    version = await acatalog_version()
+
+    async def abuild():
+        snapshot = await _aget_or_set(
+            _key("requisitions", version=version), abuild_requisitions_snapshot
+        )
+        return render_fragment("user/_requisition_grid.html", {"requisitions": snapshot})
+
+    return await _aget_or_set(_key("fragment", "requisitions", version=version), abuild)
+
+
+async def arequisition_detail_fragment(requisition_id):
+    version = await acatalog_version()
+
+    async def abuild_snapshot():
+        return await abuild_products_snapshot(requisition_id) or {}
+
+    snapshot = await _aget_or_set(
+        _key("products", requisition_id, version=version), abuild_snapshot
+    )
+    if not snapshot:
+        return None
+
+    async def abuild_html():
+        return render_fragment("user/_product_table.html", {"products": snapshot["products"]})
+
+    html = await _aget_or_set(
+        _key("fragment", "products", requisition_id, version=version), abuild_html
+    )
+    return snapshot["requisition"], html
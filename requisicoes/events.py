@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+# ======================================================
+# BACKENDS
+# ======================================================
+class Broadcaster:
+    """
+    Interface dos backends de eventos do painel.
+
+    publish() é chamado de código síncrono (views); subscribe() é um
+    gerador assíncrono usado pela view SSE, que devolve None a cada
+    `keepalive` segundos sem evento (vira ping no SSE). Para vários workers/processos
+    implemente estes dois métodos sobre algo compartilhado (Redis pub/sub,
+    LISTEN/NOTIFY do Postgres...) e aponte ORDER_EVENTS_BACKEND pra ele.
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    async def subscribe(self, channel, keepalive=None):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class LocalBroadcaster(Broadcaster):
+    """
+    Tudo em memória no processo atual: serve pra um worker ASGI e pra testes.
+    """
+
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for loop, queue in targets:
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    @staticmethod
+    def _offer(queue, event):
+        # cliente lento não trava ninguém: descarta o evento mais velho
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    async def subscribe(self, channel, keepalive=None):
+        entry = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(entry)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers.get(channel, set()).discard(entry)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                backend = getattr(settings, "ORDER_EVENTS_BACKEND", "requisicoes.events.LocalBroadcaster")
+                _broadcaster = import_string(backend)()
+    return _broadcaster
+
+
+# ======================================================
+# EVENTOS DE PEDIDO
+# ======================================================
+def location_channel(location_id):
+    return f"location:{location_id}"
+
+
+def _publish(order, event_type):
+    """
+    Evento compacto (o painel busca o card pronto se precisar). Só sai
+    depois do commit: ninguém recebe evento de pedido que não existe.
+    """
+    event = {
+        "type": event_type,
+        "id": order.id,
+        "status": order.status,
+        "status_label": order.get_status_display(),
+    }
+    channels = {
+        location_channel(order.origin_location_id),
+        location_channel(order.destination_location_id),
+    }
+
+    def send():
+        broadcaster = get_broadcaster()
+        for channel in channels:
+            broadcaster.publish(channel, event)
+
+    transaction.on_commit(send)
+
+
+def publish_order_created(order):
+    _publish(order, "order.created")
+
+
+def publish_status_changed(order):
+    _publish(order, "order.status")
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .perf import record_fragments
+
+
+# Fragmentos em cache não podem levar o token CSRF do usuário que
+# gerou o HTML: renderiza com um marcador e troca na hora de servir.
+CSRF_PLACEHOLDER = "__xodo_csrf_token__"
+
+
+def render_fragment(template_name, context=None):
+    """
+    Renderiza um pedaço de template sem request (pronto pra ir pro cache).
+    """
+    context = dict(context or {})
+    context["csrf_token"] = CSRF_PLACEHOLDER
+    return render_to_string(template_name, context)
+
+
+def with_csrf(html, request):
+    """
+    Coloca o token CSRF do request atual no fragmento vindo do cache.
+    """
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return mark_safe(html)
+
+
+def render_many_cached(name, template_name, objects, key, context, prepare=None, timeout=None):
+    """
+    Um fragmento por objeto, cada um no cache sob key(obj). Um get_many
+    busca todos; só os que faltam são renderizados (prepare(faltando)
+    roda antes, ex.: prefetch) e gravados num set_many. Retorna o HTML
+    concatenado na ordem de `objects` (ainda com o marcador de CSRF).
+    """
+    keys = [key(obj) for obj in objects]
+    found = cache.get_many(keys) if keys else {}
+
+    missing = [obj for k, obj in zip(keys, objects) if k not in found]
+    if missing:
+        if prepare:
+            prepare(missing)
+        fresh = {key(obj): render_fragment(template_name, context(obj)) for obj in missing}
+        cache.set_many(fresh, timeout)
+        found.update(fresh)
+
+    record_fragments(name, len(keys) - len(missing), len(missing))
+    return "".join(found[k] for k in keys)
@@ -0,0 +1,71 @@
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+
+from .models import Requisition
+from .thumbnails import thumbnail_sources
+
+
+# ======================================================
+# RESOLVERS (nome do arquivo -> URL pública)
+# ======================================================
+class StorageURLResolver:
+    """
+    Pergunta ao storage (Cloudinary em produção). Pode envolver lookup
+    remoto ou assinatura, por isso só roda ao salvar, nunca na listagem.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    def url(self, name):
+        return self.storage.url(name) if name else ""
+
+
+class PrefixURLResolver:
+    """
+    Prefixo fixo + nome, sem tocar no storage: serve pra CDN na frente
+    do bucket e como substituto local nos testes.
+    """
+
+    def __init__(self, prefix=None):
+        prefix = prefix if prefix is not None else settings.MEDIA_URL_PREFIX
+        self.prefix = prefix if prefix.endswith("/") else prefix + "/"
+
+    def url(self, name):
+        return f"{self.prefix}{quote(name)}" if name else ""
+
+
+def get_url_resolver():
+    backend = getattr(settings, "MEDIA_URL_RESOLVER", "requisicoes.media_urls.StorageURLResolver")
+    return import_string(backend)()
+
+
+# ======================================================
+# URLs DE UMA REQUISIÇÃO
+# ======================================================
+def resolve_media_urls(requisition, resolver=None):
+    """
+    Todas as URLs que a listagem usa, já prontas.
+    """
+    resolver = resolver or get_url_resolver()
+    return {
+        "icon": resolver.url(requisition.icon.name),
+        "image": resolver.url(requisition.image.name),
+        "thumb": thumbnail_sources(requisition.thumbnails, resolver),
+    }
+
+
+def refresh_media_urls(requisition, resolver=None):
+    """
+    Recalcula e grava (UPDATE, sem post_save) se mudou. Retorna True
+    quando gravou — quem chama troca a versão do catálogo.
+    """
+    urls = resolve_media_urls(requisition, resolver)
+    if urls == requisition.media_urls:
+        return False
+    Requisition.objects.filter(pk=requisition.pk).update(media_urls=urls)
+    requisition.media_urls = urls
+    return True
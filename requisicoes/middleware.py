@@ -1,42 +1,170 @@
-from django.db.utils import ProgrammingError, OperationalError
-from django.contrib.auth.models import AnonymousUser
+import json
+import logging
+import time
+from contextlib import ExitStack
 
-from .models import UserProfile, Location
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
 
+from .branch import branch_for_user
+from .cart_store import get_cart_store
+from .perf import QueryStats, remember
+
+
+perf_logger = logging.getLogger("requisicoes.perf")
+
+
+class BranchMiddleware:
+    """
+    Anexa request.branch (filial do usuário), resolvido sob demanda e no
+    máximo uma vez por request. Precisa vir depois do AuthenticationMiddleware.
+
+    Funciona nos dois modos (WSGI/ASGI). Views async não devem tocar no
+    valor preguiçoso (faz query síncrona): usam branch.abranch(request),
+    que troca request.branch pelo valor já resolvido.
+    """
+
+    sync_capable = True
+    async_capable = True
 
-class EnsureUserProfileMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        path = request.path_info or ""
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.branch = SimpleLazyObject(lambda: branch_for_user(request.user))
+        return self.get_response(request)
 
-        # ✅ Não mexe com admin, static, login e arquivos comuns
-        if (
-            path.startswith("/admin/")
-            or path.startswith("/static/")
-            or path.startswith("/login/")
-            or path == "/favicon.ico"
-            or path.startswith("/image/")
-        ):
-            return self.get_response(request)
+    async def __acall__(self, request):
+        request.branch = SimpleLazyObject(lambda: branch_for_user(request.user))
+        return await self.get_response(request)
 
-        user = getattr(request, "user", AnonymousUser())
 
-        if not user.is_authenticated:
-            return self.get_response(request)
+class CartMiddleware:
+    """
+    Anexa request.cart (ver cart_store.CartStore) e grava o carrinho uma
+    vez na resposta, só se alguma view mexeu nele.
+    """
 
-        try:
-            profile = getattr(user, "profile", None)
+    sync_capable = True
+    async_capable = True
 
-            if profile is None:
-                location = Location.objects.first()
-                if location:
-                    UserProfile.objects.get_or_create(
-                        user=user, defaults={"location": location}
-                    )
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
-        except (ProgrammingError, OperationalError):
-            return self.get_response(request)
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.cart = get_cart_store(request)
+        response = self.get_response(request)
+        if request.cart.modified:
+            request.cart.save(response)
+        return response
 
-        return self.get_response(request)
+    async def __acall__(self, request):
+        request.cart = get_cart_store(request)
+        response = await self.get_response(request)
+        if request.cart.modified:
+            await sync_to_async(request.cart.save)(response)
+        return response
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise que também roda em modo async.
+
+    O original é só síncrono: sob ASGI o Django teria que passar toda
+    request por uma thread (sync_to_async), e as views async perderiam
+    a concorrência. Aqui o lookup do arquivo é um dict (ou stat em DEBUG),
+    então dá pra fazer direto no event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Por request: nº de queries, tempo total de banco, queries mais lentas
+    e SQL repetido (N+1). Sai no header Server-Timing, numa linha de log
+    JSON (logger "requisicoes.perf") e, se PERF_RING_SIZE > 0, na tela
+    /xodo-admin/perf/.
+
+    Desligado (PERF_INSTRUMENTATION=False) o Django nem instancia o
+    middleware: custo zero. Só síncrono: sob ASGI, ligar isto serializa
+    as requests numa thread — use só pra diagnóstico.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "PERF_SLOW_REQUEST_MS", 500)
+        self.n_plus_one = getattr(settings, "PERF_DUPLICATE_THRESHOLD", 5)
+        self.keep_recent = getattr(settings, "PERF_RING_SIZE", 200) > 0
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = stats.total * 1000
+
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+        )
+
+        match = getattr(request, "resolver_match", None)
+        entry = {
+            "at": time.time(),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "ms": round(total_ms, 1),
+            "db_ms": round(db_ms, 1),
+            "queries": stats.count,
+            "duplicates": stats.duplicates(),
+            "slowest": stats.slowest(),
+        }
+
+        suspect = any(d["count"] >= self.n_plus_one for d in entry["duplicates"])
+        level = logging.WARNING if total_ms >= self.slow_ms or suspect else logging.INFO
+        perf_logger.log(level, json.dumps(entry, ensure_ascii=False))
+
+        if self.keep_recent:
+            remember(entry)
+        return response
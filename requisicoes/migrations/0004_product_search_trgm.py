@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# pg_trgm + índices GIN pro TrigramSearchBackend. Só no Postgres e só com
+# esse backend configurado (CREATE EXTENSION pede privilégio que banco
+# gerenciado pode negar). Trocou de backend depois? manage.py
+# enable_trigram_search. Com o MemorySearchBackend nada disso é usado.
+# SQL escrito aqui mesmo: a migration não pode depender de requisicoes.search,
+# que muda com o tempo.
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS "product_name_trgm_idx" '
+    'ON "requisicoes_product" USING gin ("name" gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS "requisition_name_trgm_idx" '
+    'ON "requisicoes_requisition" USING gin ("name" gin_trgm_ops)',
+]
+
+DROP_SQL = [
+    'DROP INDEX IF EXISTS "product_name_trgm_idx"',
+    'DROP INDEX IF EXISTS "requisition_name_trgm_idx"',
+]
+
+
+def create_trgm_indexes(apps, schema_editor):
+    backend = getattr(settings, "SEARCH_BACKEND", "")
+    if schema_editor.connection.vendor == "postgresql" and backend.endswith("TrigramSearchBackend"):
+        for sql in CREATE_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for sql in DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisicoes', '0003_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisicoes', '0005_order_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requisition',
+            name='thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('requisicoes', '0006_requisition_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requisition',
+            name='media_urls',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Location(models.Model):
@@ -25,6 +26,15 @@ class Requisition(models.Model):
     icon = models.ImageField(upload_to="requisitions/icons/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # miniaturas geradas (requisicoes/thumbnails.py):
+    # {"icon": {"source": nome original, "webp": {"80": nome, ...}, "png": {...}}}
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+
+    # URLs públicas já resolvidas (requisicoes/media_urls.py), lidas pelas
+    # listagens no lugar de icon.url/image.url:
+    # {"icon": url, "image": url, "thumb": {"src", "webp", "png"} ou None}
+    media_urls = models.JSONField(default=dict, blank=True, editable=False)
+
     def __str__(self):
         return self.name
 
@@ -37,6 +47,12 @@ class Product(models.Model):
     )
     name = models.CharField(max_length=120)
 
+    class Meta:
+        indexes = [
+            # produtos de uma requisição em ordem alfabética (tela de detalhe)
+            models.Index(fields=["requisition", "name"], name="product_req_name_idx"),
+        ]
+
     def __str__(self):
         return f"{self.requisition.name} - {self.name}"
 
@@ -63,6 +79,43 @@ class Order(models.Model):
     status = models.CharField(max_length=30, choices=Status.choices, default=Status.CRIADO)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # ✅ resumo mantido no envio e a cada troca de status (listar/ordenar sem JOIN)
+    # recalcular tudo: python manage.py recompute_order_summaries
+    item_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    status_changed_at = models.DateTimeField(default=timezone.now)
+
+    # sobe a cada troca de status/edição de item: chave do card em cache
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # painel Austin (ordem padrão, com ou sem ?status=): percorre o
+            # índice já na ordem (created_at, id) e para no LIMIT, sem sort
+            models.Index(
+                fields=["destination_location", "-created_at", "-id"],
+                name="order_dest_created_idx",
+            ),
+            # painel Austin com um status só
+            models.Index(
+                fields=["destination_location", "status", "-created_at"],
+                name="order_dest_status_created_idx",
+            ),
+            # "Meus pedidos" da filial de origem
+            models.Index(
+                fields=["origin_location", "-created_at", "-id"],
+                name="order_origin_created_idx",
+            ),
+            models.Index(
+                fields=["destination_location", "-total_quantity"],
+                name="order_dest_size_idx",
+            ),
+            models.Index(
+                fields=["destination_location", "status_changed_at"],
+                name="order_dest_stale_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id}"
 
@@ -82,5 +135,64 @@ class OrderStatusHistory(models.Model):
     changed_at = models.DateTimeField(auto_now_add=True)
     changed_by = models.ForeignKey(User, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            # linha do tempo de um pedido
+            models.Index(fields=["order", "changed_at"], name="history_order_changed_idx"),
+        ]
+
     def __str__(self):
         return f"Pedido {self.order.id} - {self.status} - {self.changed_at}"
+
+
+# ======================================================
+# ROLLUPS DO DASHBOARD (python manage.py update_rollups)
+# ======================================================
+class DailyProductRollup(models.Model):
+    """
+    Quantidade pedida por dia x filial destino x produto (dia do pedido).
+    """
+    day = models.DateField()
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="+")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "day", "product"], name="rollup_product_unique"
+            ),
+        ]
+
+
+class DailyTransitionRollup(models.Model):
+    """
+    Trocas de status por dia x filial destino x (status anterior -> novo).
+    from_status "" = pedido criado. step_seconds soma o tempo no status
+    anterior; lead_seconds (só em RECEBIDO_ORIGEM) soma criação -> recebido.
+    """
+    day = models.DateField()
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name="+")
+    from_status = models.CharField(max_length=30, blank=True)
+    to_status = models.CharField(max_length=30)
+    count = models.PositiveIntegerField(default=0)
+    step_seconds = models.BigIntegerField(default=0)
+    lead_seconds = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["location", "day", "from_status", "to_status"],
+                name="rollup_transition_unique",
+            ),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """
+    Último OrderStatusHistory.id já somado nos rollups.
+    """
+    name = models.CharField(max_length=40, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
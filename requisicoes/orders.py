@@ -0,0 +1,297 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Q, prefetch_related_objects
+
+from .catalog import catalog_version
+from .fragments import render_many_cached
+from .models import Order, OrderItem
+
+
+ORDER_PAGE_SIZE = 25
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+# ======================================================
+# LISTAGEM DE PEDIDOS
+# ======================================================
+def _listing_items():
+    return Prefetch("items", queryset=OrderItem.objects.select_related("product").order_by("id"))
+
+
+def order_listing_queryset(with_items=True, **filters):
+    """
+    Queryset base das listagens de pedidos.
+
+    Origem/destino vêm no mesmo SELECT e os itens (com produto) em um
+    único prefetch: 2 queries por página, independente da quantidade de
+    pedidos ou itens. with_items=False deixa o prefetch pra depois (cards
+    em cache só precisam de itens dos pedidos que mudaram).
+    """
+    queryset = (
+        Order.objects.filter(**filters)
+        .select_related("origin_location", "destination_location")
+    )
+    if with_items:
+        queryset = queryset.prefetch_related(_listing_items())
+    return queryset
+
+
+def order_detail_queryset():
+    """
+    Pedido completo pra telas de detalhe/PDF: itens com produto e requisição.
+    """
+    items = OrderItem.objects.select_related("product__requisition").order_by("id")
+    return (
+        Order.objects
+        .select_related("created_by", "origin_location", "destination_location")
+        .prefetch_related(Prefetch("items", queryset=items))
+    )
+
+
+def parse_status_filter(values):
+    """
+    Mantém só os status válidos (ignora lixo vindo da querystring).
+    """
+    valid = set(Order.Status.values)
+    return [v for v in values if v in valid]
+
+
+# ======================================================
+# ORDENAÇÃO + PAGINAÇÃO POR CURSOR (campo, id)
+# ======================================================
+# ?ordem= -> (campo, decrescente). Todos usam colunas do próprio Order
+# (resumo desnormalizado), então ordenar não precisa de JOIN/agregação.
+ORDER_SORTS = {
+    "recentes": ("created_at", True),
+    "maiores": ("total_quantity", True),
+    "parados": ("status_changed_at", False),
+}
+DEFAULT_SORT = "recentes"
+
+SORT_CHOICES = [
+    ("recentes", "Mais recentes"),
+    ("maiores", "Maiores"),
+    ("parados", "Parados há mais tempo"),
+]
+
+
+def _to_int(value):
+    if isinstance(value, datetime):
+        # inteiro em microssegundos: sem perda de precisão de float
+        delta = value - _EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return int(value)
+
+
+def _from_int(field_name, raw):
+    if isinstance(Order._meta.get_field(field_name), models.DateTimeField):
+        return _EPOCH + timedelta(microseconds=raw)
+    return raw
+
+
+def encode_cursor(order, sort=DEFAULT_SORT):
+    field_name, _ = ORDER_SORTS[sort]
+    return f"{_to_int(getattr(order, field_name))}-{order.id}"
+
+
+def decode_cursor(cursor, sort=DEFAULT_SORT):
+    """
+    Retorna (valor do campo de ordenação, id) ou None se o cursor for inválido.
+    """
+    field_name, _ = ORDER_SORTS[sort]
+    try:
+        raw, pk = cursor.split("-", 1)
+        return _from_int(field_name, int(raw)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+@dataclass
+class OrderPage:
+    orders: list
+    next_cursor: str = None
+    statuses: list = field(default_factory=list)
+    sort: str = DEFAULT_SORT
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _page_queryset(queryset, cursor, statuses, sort, page_size):
+    """
+    Monta o queryset da página (filtro de status, ordenação e keyset).
+    Retorna (queryset fatiado, statuses válidos, sort efetivo).
+    """
+    if sort not in ORDER_SORTS:
+        sort = DEFAULT_SORT
+    field_name, descending = ORDER_SORTS[sort]
+
+    statuses = parse_status_filter(statuses or [])
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+
+    if descending:
+        queryset = queryset.order_by(f"-{field_name}", "-id")
+    else:
+        queryset = queryset.order_by(field_name, "id")
+
+    position = decode_cursor(cursor, sort) if cursor else None
+    if position:
+        value, pk = position
+        op = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field_name}__{op}": value}) | Q(**{field_name: value, f"id__{op}": pk})
+        )
+
+    # busca 1 a mais só pra saber se existe próxima página
+    return queryset[:page_size + 1], statuses, sort
+
+
+def _build_page(orders, statuses, sort, page_size):
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = encode_cursor(orders[-1], sort)
+
+    return OrderPage(orders=orders, next_cursor=next_cursor, statuses=statuses, sort=sort)
+
+
+def paginate_orders(queryset, cursor=None, statuses=None, sort=DEFAULT_SORT,
+                    page_size=ORDER_PAGE_SIZE):
+    """
+    Página de pedidos na ordem pedida (padrão: mais novo primeiro).
+
+    Usa keyset em vez de OFFSET: a página N custa o mesmo que a página 1.
+    """
+    queryset, statuses, sort = _page_queryset(queryset, cursor, statuses, sort, page_size)
+    return _build_page(list(queryset), statuses, sort, page_size)
+
+
+async def apaginate_orders(queryset, cursor=None, statuses=None, sort=DEFAULT_SORT,
+                           page_size=ORDER_PAGE_SIZE):
+    """
+    Mesmo que paginate_orders, pra views async (prefetch incluído).
+    """
+    queryset, statuses, sort = _page_queryset(queryset, cursor, statuses, sort, page_size)
+    return _build_page([o async for o in queryset], statuses, sort, page_size)
+
+
+def _request_params(request):
+    return {
+        "cursor": request.GET.get("cursor"),
+        "statuses": request.GET.getlist("status"),
+        "sort": request.GET.get("ordem", DEFAULT_SORT),
+    }
+
+
+def order_page_for_request(request, with_items=True, **filters):
+    """
+    Atalho pras views: lê ?cursor=, ?status= e ?ordem= da querystring.
+    """
+    return paginate_orders(
+        order_listing_queryset(with_items, **filters), **_request_params(request)
+    )
+
+
+async def aorder_page_for_request(request, with_items=True, **filters):
+    return await apaginate_orders(
+        order_listing_queryset(with_items, **filters), **_request_params(request)
+    )
+
+
+# ======================================================
+# CARDS DE PEDIDO EM CACHE (chave: catálogo + id + status + versão)
+# ======================================================
+ADMIN_CARD = "admin/_order_card.html"
+USER_CARD = "user/_order_card.html"
+
+
+def bump_order_version(**filters):
+    """
+    Invalida o card em cache dos pedidos filtrados (version + 1).
+    """
+    return Order.objects.filter(**filters).update(version=F("version") + 1)
+
+
+def refresh_order_summary(order_id):
+    """
+    Item incluído/editado/removido fora do carrinho (admin): recalcula
+    item_count/total_quantity do pedido (um aggregate + um UPDATE) e
+    invalida o card.
+    """
+    totals = OrderItem.objects.filter(order_id=order_id).aggregate(
+        count=models.Count("id"), quantity=models.Sum("quantity")
+    )
+    return Order.objects.filter(pk=order_id).update(
+        item_count=totals["count"],
+        total_quantity=totals["quantity"] or 0,
+        version=F("version") + 1,
+    )
+
+
+class _SummaryRefresh:
+    """
+    Pedidos com item removido na transação atual; recalculados uma vez
+    cada, no commit (ver refresh_order_summary_on_commit).
+    """
+
+    def __init__(self):
+        self.order_ids = set()
+
+    def __call__(self):
+        order_ids, self.order_ids = self.order_ids, set()
+        # apagados junto com os itens (cascade) não têm o que recalcular
+        for order_id in Order.objects.filter(pk__in=order_ids).values_list("pk", flat=True):
+            refresh_order_summary(order_id)
+
+
+def refresh_order_summary_on_commit(order_id, using=None):
+    """
+    refresh_order_summary adiado pro commit, uma vez por pedido: apagar um
+    pedido no admin dispara post_delete em cada item (cascade), e sem isso
+    seriam um aggregate + UPDATE por item num pedido que também vai sumir.
+    """
+    connection = transaction.get_connection(using)
+    batch = getattr(connection, "_order_summary_refresh", None)
+    # sem callback pendente (já rodou ou o rollback descartou): começa outro
+    if batch is None or not any(hook is batch for _, hook, _ in connection.run_on_commit):
+        batch = connection._order_summary_refresh = _SummaryRefresh()
+        batch.order_ids.add(order_id)
+        transaction.on_commit(batch, using=using)
+    else:
+        batch.order_ids.add(order_id)
+
+
+def order_card_key(template_name, order, catalog=None):
+    # o card mostra nomes de produto: produto renomeado troca a versão do
+    # catálogo (invalidate_catalog) e com ela todos os cards
+    if catalog is None:
+        catalog = catalog_version()
+    return f"card:{template_name}:{catalog}:{order.id}:{order.status}:{order.version}"
+
+
+def order_cards(template_name, orders):
+    """
+    HTML dos cards da página (com marcador de CSRF: servir com with_csrf).
+    Itens só são buscados pros pedidos sem card em cache.
+    """
+    def prefetch_items(missing):
+        missing = [o for o in missing if "items" not in getattr(o, "_prefetched_objects_cache", {})]
+        if missing:
+            prefetch_related_objects(missing, _listing_items())
+
+    catalog = catalog_version()
+    return render_many_cached(
+        template_name,
+        template_name,
+        list(orders),
+        key=lambda order: order_card_key(template_name, order, catalog),
+        context=lambda order: {"order": order},
+        prepare=prefetch_items,
+        timeout=getattr(settings, "ORDER_CARD_CACHE_TIMEOUT", 86400),
+    )
@@ -0,0 +1,109 @@
+import calendar
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .orders import order_detail_queryset
+
+
+# ======================================================
+# RENDERIZAÇÃO
+# ======================================================
+def html_to_pdf(html):
+    """
+    HTML -> bytes do PDF (xhtml2pdf). Função pura: pode rodar em outro processo.
+    """
+    from xhtml2pdf import pisa
+
+    buffer = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=buffer, encoding="utf-8")
+    if result.err:
+        raise ValueError("Falha ao gerar PDF do pedido.")
+    return buffer.getvalue()
+
+
+def order_for_pdf(order_id):
+    return order_detail_queryset().get(id=order_id)
+
+
+def render_order_html(order):
+    return render_to_string("pdf/order.html", {"order": order})
+
+
+def render_order_pdf(order):
+    return html_to_pdf(render_order_html(order))
+
+
+# ======================================================
+# CACHE EM DISCO
+# ======================================================
+def cache_dir():
+    path = Path(getattr(settings, "PDF_CACHE_DIR", settings.BASE_DIR / "var" / "pdf"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def stamp_token(stamp, version):
+    """
+    Timestamp do último status em microssegundos + Order.version (entra no
+    nome do arquivo e no ETag). A version cobre o que não gera histórico:
+    itens editados no admin.
+    """
+    micros = calendar.timegm(stamp.utctimetuple()) * 1_000_000 + stamp.microsecond
+    return f"{micros}v{version}"
+
+
+def cache_path(order_id, stamp, version):
+    return cache_dir() / f"order-{order_id}-{stamp_token(stamp, version)}.pdf"
+
+
+def invalidate_order_pdf(order_id, keep=None):
+    """
+    Apaga as versões em cache do PDF do pedido (menos `keep`, se passado).
+    """
+    for path in cache_dir().glob(f"order-{order_id}-*.pdf"):
+        if path != keep:
+            path.unlink(missing_ok=True)
+
+
+def invalidate_order_pdfs(order_ids):
+    """
+    Várias de uma vez (avanço em lote): uma listagem do diretório só.
+    """
+    prefixes = {f"order-{order_id}-" for order_id in order_ids}
+    if not prefixes:
+        return
+    for path in cache_dir().glob("order-*.pdf"):
+        if path.name[:path.name.rindex("-") + 1] in prefixes:
+            path.unlink(missing_ok=True)
+
+
+def cached_order_pdf(order_id, stamp, version):
+    """
+    PDF do pedido na versão (`stamp`, `version`), já aberto para leitura,
+    renderizando só se ainda não existir. Troca de status ou edição muda a
+    chave, então a versão velha nunca é servida.
+
+    Devolve o arquivo aberto, não o caminho: outro worker pode apagar a
+    versão do disco (invalidate_order_pdf) entre o exists() e o open().
+    """
+    path = cache_path(order_id, stamp, version)
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        pass
+
+    data = render_order_pdf(order_for_pdf(order_id))
+
+    # escrita atômica: outro worker nunca lê um PDF pela metade
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+    invalidate_order_pdf(order_id, keep=path)
+    return io.BytesIO(data)
@@ -0,0 +1,104 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Order
+
+
+# Pedidos que ainda dependem da filial destino (badge do painel de Austin).
+PENDING_STATUSES = (
+    Order.Status.CRIADO,
+    Order.Status.RECEBIDO_DESTINO,
+    Order.Status.SEPARANDO,
+)
+
+
+def _key(location_id):
+    return f"pending:{location_id}"
+
+
+def _counted_at_key(location_id):
+    # quando terminou o COUNT que encheu _key (ver _adjust)
+    return f"pending:{location_id}:at"
+
+
+def _timeout():
+    # teto pro desvio se algo mudar status por fora (admin, shell)
+    return getattr(settings, "PENDING_COUNT_TIMEOUT", 300)
+
+
+# ======================================================
+# LEITURA
+# ======================================================
+def count_pending(location_id):
+    """
+    COUNT direto no banco (índice destino+status).
+    """
+    return Order.objects.filter(
+        destination_location_id=location_id, status__in=PENDING_STATUSES
+    ).count()
+
+
+def pending_count(location_id):
+    """
+    Nº de pedidos pendentes da filial destino. Vem do cache; no miss,
+    um COUNT indexado repopula.
+    """
+    if location_id is None:
+        return 0
+
+    value = cache.get(_key(location_id))
+    if value is None:
+        value = count_pending(location_id)
+        # o horário vai antes do valor: quem ler o valor já acha o horário
+        cache.set(_counted_at_key(location_id), time.time(), _timeout())
+        cache.add(_key(location_id), value, _timeout())
+    return value
+
+
+# ======================================================
+# ATUALIZAÇÃO INCREMENTAL
+# ======================================================
+def _adjust(location_id, delta, recorded_at):
+    """
+    Aplica o delta de uma transição já commitada. Se o valor em cache
+    veio de um COUNT que terminou depois da transição ser registrada,
+    esse COUNT pode já ter visto o pedido (commit antes do SELECT, ou a
+    própria transação contando): somar de novo contaria duas vezes. Aí a
+    chave é descartada e a próxima leitura recalcula.
+    """
+    counted_at = cache.get(_counted_at_key(location_id))
+    if counted_at is None or counted_at >= recorded_at:
+        invalidate_pending(location_id)
+        return
+
+    try:
+        if delta > 0:
+            cache.incr(_key(location_id), delta)
+        else:
+            cache.decr(_key(location_id), -delta)
+    except ValueError:
+        # chave não está no cache: a próxima leitura recalcula
+        pass
+
+
+def record_transition(location_id, old_status, new_status, count=1):
+    """
+    Ajusta o contador quando `count` pedidos da filial destino passam de
+    old_status pra new_status (old_status=None = pedido criado). Só vale
+    depois do commit: rollback não mexe no cache.
+    """
+    was_pending = old_status in PENDING_STATUSES
+    is_pending = new_status in PENDING_STATUSES
+    if was_pending == is_pending or not count:
+        return
+
+    delta = count if is_pending else -count
+    recorded_at = time.time()
+    transaction.on_commit(lambda: _adjust(location_id, delta, recorded_at))
+
+
+def invalidate_pending(location_id):
+    cache.delete_many([_key(location_id), _counted_at_key(location_id)])
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+
+# ======================================================
+# COLETOR DE QUERIES (connection.execute_wrapper)
+# ======================================================
+class QueryStats:
+    """
+    Conta e cronometra as queries de um request.
+
+    O SQL chega com placeholders (%s) e os parâmetros à parte, então a
+    mesma string repetida várias vezes é assinatura de N+1.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.timings = []
+        self.by_sql = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            self.timings.append((elapsed, sql))
+            self.by_sql[sql] += 1
+
+    def slowest(self, limit=5):
+        return [
+            {"ms": round(elapsed * 1000, 2), "sql": sql[:500]}
+            for elapsed, sql in sorted(self.timings, key=lambda t: t[0], reverse=True)[:limit]
+        ]
+
+    def duplicates(self, min_count=2, limit=5):
+        return [
+            {"count": count, "sql": sql[:500]}
+            for sql, count in self.by_sql.most_common(limit)
+            if count >= min_count
+        ]
+
+
+# ======================================================
+# ÚLTIMOS REQUESTS (ring buffer em memória, por processo)
+# ======================================================
+_recent = deque(maxlen=getattr(settings, "PERF_RING_SIZE", 200) or 1)
+_lock = threading.Lock()
+
+
+def remember(entry):
+    with _lock:
+        _recent.append(entry)
+
+
+def recent_requests():
+    """
+    Mais novos primeiro.
+    """
+    with _lock:
+        return list(reversed(_recent))
+
+
+# ======================================================
+# FRAGMENTOS EM CACHE (hit/miss por processo)
+# ======================================================
+_fragments = {}
+
+
+def record_fragments(name, hits, misses):
+    with _lock:
+        stats = _fragments.setdefault(name, {"hits": 0, "misses": 0})
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+
+def fragment_stats():
+    """
+    [{"name", "hits", "misses", "hit_rate"}] desde que o processo subiu.
+    """
+    with _lock:
+        rows = [dict(stats, name=name) for name, stats in sorted(_fragments.items())]
+    for row in rows:
+        total = row["hits"] + row["misses"]
+        row["hit_rate"] = round(100 * row["hits"] / total, 1) if total else 0.0
+    return rows
@@ -0,0 +1,113 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Order, OrderItem
+from .orders import order_detail_queryset
+from .pdf import cache_path, html_to_pdf, render_order_html
+
+
+# ======================================================
+# SELEÇÃO + AGREGAÇÃO
+# ======================================================
+def select_orders(status=None, date_from=None, date_to=None, **filters):
+    """
+    Pedidos do lote de separação (status e/ou intervalo de datas de criação).
+    """
+    qs = Order.objects.filter(**filters)
+    if status:
+        qs = qs.filter(status=status)
+    if date_from:
+        qs = qs.filter(created_at__date__gte=date_from)
+    if date_to:
+        qs = qs.filter(created_at__date__lte=date_to)
+    return qs
+
+
+def aggregate_items(orders_qs):
+    """
+    Total por produto em todos os pedidos do lote: um GROUP BY só.
+    """
+    return list(
+        OrderItem.objects.filter(order__in=orders_qs)
+        .values("product_id", "product__name", "product__requisition__name")
+        .annotate(total=Sum("quantity"), orders=Count("order_id", distinct=True))
+        .order_by("product__requisition__name", "product__name")
+    )
+
+
+def _orders_for_pages(orders_qs):
+    return list(
+        order_detail_queryset()
+        .filter(id__in=orders_qs.values("id"))
+        .annotate(stamp=Max("status_history__changed_at"))
+        .order_by("created_at", "id")
+    )
+
+
+# ======================================================
+# PDF DO LOTE
+# ======================================================
+def _render_many(htmls, workers):
+    """
+    HTML -> PDF em paralelo (processos). Lote pequeno roda aqui mesmo:
+    subir o pool custa mais que renderizar 2 ou 3 páginas.
+    """
+    if workers <= 1 or len(htmls) < 4:
+        return [html_to_pdf(html) for html in htmls]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(htmls))) as pool:
+        return list(pool.map(html_to_pdf, htmls, chunksize=max(1, len(htmls) // (workers * 4))))
+
+
+def build_picking_pdf(orders_qs, filters=None, workers=None):
+    """
+    Um PDF com a lista de separação consolidada + uma página por pedido.
+
+    Páginas de pedidos que já estão no cache de PDFs (requisicoes/pdf.py)
+    são reaproveitadas; as demais são renderizadas no pool de processos
+    (workers=1 renderiza aqui mesmo: é o que a view usa, um pool por
+    request num worker do gunicorn não vale o fork).
+    Retorna (bytes, quantidade de pedidos).
+    """
+    from pypdf import PdfWriter
+
+    if workers is None:
+        workers = getattr(settings, "PDF_EXPORT_WORKERS", None) or os.cpu_count() or 1
+
+    orders = _orders_for_pages(orders_qs)
+    rows = aggregate_items(orders_qs)
+
+    summary_html = render_to_string("pdf/picking_list.html", {
+        "rows": rows,
+        "orders": orders,
+        "filters": filters or {},
+        "generated_at": timezone.now(),
+    })
+
+    documents = [None] * len(orders)
+    pending = []
+    for index, order in enumerate(orders):
+        path = cache_path(order.id, order.stamp or order.created_at, order.version)
+        if path.exists():
+            documents[index] = path.read_bytes()
+        else:
+            pending.append((index, render_order_html(order)))
+
+    rendered = _render_many([summary_html] + [html for _, html in pending], workers)
+    summary_pdf = rendered[0]
+    for (index, _), data in zip(pending, rendered[1:]):
+        documents[index] = data
+
+    writer = PdfWriter()
+    for data in [summary_pdf, *documents]:
+        writer.append(io.BytesIO(data))
+
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue(), len(orders)
@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import io
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _lru(func):
+    """
+    lru_cache com o tamanho de settings.QR_CACHE_SIZE lido na primeira
+    chamada, não no import (override_settings / settings de teste valem).
+    """
+    cached = None
+
+    @wraps(func)
+    def wrapper(data):
+        nonlocal cached
+        if cached is None:
+            cached = lru_cache(maxsize=getattr(settings, "QR_CACHE_SIZE", 512))(func)
+        return cached(data)
+
+    def cache_clear():
+        nonlocal cached
+        cached = None
+
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_info = lambda: cached.cache_info() if cached else None
+    return wrapper
+
+
+def _build_png(data):
+    import qrcode
+
+    image = qrcode.make(data, box_size=8, border=2)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@_lru
+def qr_png(data):
+    """
+    PNG do QR code de `data` (normalmente a URL do pedido).
+
+    Duas camadas: LRU no processo e o cache do Django (compartilhado
+    entre workers quando o backend é file). O QR de uma URL nunca muda.
+    """
+    key = "qr:" + hashlib.sha1(data.encode("utf-8")).hexdigest()
+    png = cache.get(key)
+    if png is None:
+        png = _build_png(data)
+        cache.set(key, png, timeout=None)
+    return png
+
+
+@_lru
+def qr_base64(data):
+    """
+    Versão pronta pra <img src="data:image/png;base64,...">.
+    """
+    return base64.b64encode(qr_png(data)).decode("ascii")
@@ -0,0 +1,230 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import Lag
+from django.utils import timezone
+
+from .models import (
+    DailyProductRollup,
+    DailyTransitionRollup,
+    Order,
+    OrderItem,
+    OrderStatusHistory,
+    RollupWatermark,
+)
+from .timeline import format_duration
+
+
+WATERMARK = "dashboard"
+DONE = Order.Status.RECEBIDO_ORIGEM
+
+TRANSITION_KEY = ("location_id", "day", "from_status", "to_status")
+TRANSITION_VALUES = ("count", "step_seconds", "lead_seconds")
+PRODUCT_KEY = ("location_id", "day", "product_id")
+PRODUCT_VALUES = ("orders", "quantity")
+
+
+# ======================================================
+# ATUALIZAÇÃO INCREMENTAL (a partir do watermark)
+# ======================================================
+def _new_history(after_id, until, limit):
+    return list(
+        OrderStatusHistory.objects
+        .filter(id__gt=after_id, changed_at__lt=until)
+        .order_by("id")
+        .values_list("id", "order_id")[:limit]
+    )
+
+
+def _history_with_previous(order_ids):
+    """
+    Histórico completo dos pedidos do lote com status/momento anterior
+    (LAG): a linha anterior pode ser de um lote já processado.
+    """
+    window = {
+        "partition_by": [F("order_id")],
+        "order_by": [F("changed_at").asc(), F("id").asc()],
+    }
+    return (
+        OrderStatusHistory.objects
+        .filter(order_id__in=order_ids)
+        .annotate(
+            from_status=Window(Lag("status"), **window),
+            previous_at=Window(Lag("changed_at"), **window),
+        )
+        .values(
+            "id", "order_id", "status", "changed_at", "from_status", "previous_at",
+            "order__created_at", "order__destination_location_id",
+        )
+    )
+
+
+def _merge(model, key_fields, value_fields, deltas):
+    """
+    Soma `deltas` ({chave: [valores]}) nas linhas do rollup: uma leitura,
+    um bulk_update e um bulk_create.
+    """
+    if not deltas:
+        return
+    existing = {
+        tuple(getattr(row, f) for f in key_fields): row
+        for row in model.objects.filter(
+            location_id__in={key[0] for key in deltas},
+            day__in={key[1] for key in deltas},
+        )
+    }
+    changed, created = [], []
+    for key, values in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            created.append(model(**dict(zip(key_fields, key)), **dict(zip(value_fields, values))))
+            continue
+        for name, value in zip(value_fields, values):
+            setattr(row, name, getattr(row, name) + value)
+        changed.append(row)
+    if changed:
+        model.objects.bulk_update(changed, value_fields)
+    if created:
+        model.objects.bulk_create(created)
+
+
+def _process(batch):
+    """
+    Soma nos rollups as linhas de histórico do lote [(id, order_id)].
+    """
+    new_ids = {history_id for history_id, _ in batch}
+    transitions = defaultdict(lambda: [0, 0, 0])
+    created = {}  # order_id -> (filial destino, dia da criação)
+
+    for row in _history_with_previous({order_id for _, order_id in batch}):
+        if row["id"] not in new_ids:
+            continue
+        location = row["order__destination_location_id"]
+        day = timezone.localdate(row["changed_at"])
+        deltas = transitions[(location, day, row["from_status"] or "", row["status"])]
+        deltas[0] += 1
+        if row["previous_at"] is not None:
+            deltas[1] += int((row["changed_at"] - row["previous_at"]).total_seconds())
+        else:
+            created[row["order_id"]] = (location, day)
+        if row["status"] == DONE:
+            deltas[2] += int((row["changed_at"] - row["order__created_at"]).total_seconds())
+
+    products = defaultdict(lambda: [0, 0])
+    if created:
+        items = OrderItem.objects.filter(order_id__in=created).values_list(
+            "order_id", "product_id", "quantity"
+        )
+        for order_id, product_id, quantity in items:
+            location, day = created[order_id]
+            deltas = products[(location, day, product_id)]
+            deltas[0] += 1
+            deltas[1] += quantity
+
+    _merge(DailyTransitionRollup, TRANSITION_KEY, TRANSITION_VALUES, transitions)
+    _merge(DailyProductRollup, PRODUCT_KEY, PRODUCT_VALUES, products)
+
+
+def update_rollups(batch_size=1000, settle_seconds=60, progress=None):
+    """
+    Processa o histórico novo desde o watermark, um lote por transação
+    (rollups + watermark juntos: interromper no meio não duplica nada).
+
+    Só entram linhas com mais de `settle_seconds`: um id menor que ainda
+    não commitou quando o watermark passou por ele seria perdido.
+    Retorna quantas linhas de histórico foram somadas.
+    """
+    until = timezone.now() - timedelta(seconds=settle_seconds)
+    total = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = (
+                RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+            )
+            batch = _new_history(watermark.last_id, until, batch_size)
+            if not batch:
+                return total
+            _process(batch)
+            watermark.last_id = batch[-1][0]
+            watermark.save(update_fields=["last_id", "updated_at"])
+
+        total += len(batch)
+        if progress:
+            progress(total)
+
+
+@transaction.atomic
+def reset_rollups():
+    """
+    Apaga os rollups e zera o watermark (o próximo update_rollups refaz
+    tudo). Necessário depois de apagar/editar pedidos pelo admin.
+    """
+    DailyTransitionRollup.objects.all().delete()
+    DailyProductRollup.objects.all().delete()
+    RollupWatermark.objects.filter(name=WATERMARK).delete()
+
+
+# ======================================================
+# LEITURA (dashboard: só tabelas de rollup)
+# ======================================================
+def dashboard_data(location_id, days=30, top=10):
+    """
+    Números do dashboard da filial destino nos últimos `days` dias. Lê só
+    os rollups: o custo depende de dias x produtos, não do histórico.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    transitions = DailyTransitionRollup.objects.filter(location_id=location_id, day__gte=since)
+
+    per_day = list(
+        transitions.values("day")
+        .annotate(
+            created=Sum("count", filter=Q(from_status="")),
+            completed=Sum("count", filter=Q(to_status=DONE)),
+            lead=Sum("lead_seconds", filter=Q(to_status=DONE)),
+        )
+        .order_by("-day")
+    )
+    completed = sum(d["completed"] or 0 for d in per_day)
+    lead = sum(d["lead"] or 0 for d in per_day)
+    for d in per_day:
+        d["created"] = d["created"] or 0
+        d["completed"] = d["completed"] or 0
+        d["lead_time"] = format_duration(d["lead"] / d["completed"]) if d["completed"] else ""
+
+    labels = dict(Order.Status.choices)
+    flow = {value: i for i, value in enumerate(Order.Status.values)}
+    steps = []
+    rows = (
+        transitions.exclude(from_status="")
+        .values("from_status", "to_status")
+        .annotate(count=Sum("count"), seconds=Sum("step_seconds"))
+        .order_by()
+    )
+    for row in sorted(rows, key=lambda r: flow.get(r["to_status"], len(flow))):
+        steps.append({
+            "from_label": labels.get(row["from_status"], row["from_status"]),
+            "to_label": labels.get(row["to_status"], row["to_status"]),
+            "count": row["count"],
+            "average": format_duration(row["seconds"] / row["count"]),
+        })
+
+    top_products = list(
+        DailyProductRollup.objects.filter(location_id=location_id, day__gte=since)
+        .values("product_id", "product__name")
+        .annotate(quantity=Sum("quantity"), orders=Sum("orders"))
+        .order_by("-quantity", "product__name")[:top]
+    )
+
+    watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+    return {
+        "days": days,
+        "per_day": per_day,
+        "created": sum(d["created"] for d in per_day),
+        "completed": completed,
+        "lead_time": format_duration(lead / completed) if completed else "",
+        "steps": steps,
+        "top_products": top_products,
+        "updated_at": watermark.updated_at if watermark else None,
+    }
@@ -0,0 +1,318 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .catalog import catalog_version
+from .models import Product
+
+
+SEARCH_LIMIT = 30
+TRIGRAM_THRESHOLD = 0.3  # mesmo padrão do pg_trgm
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+# ======================================================
+# NORMALIZAÇÃO
+# ======================================================
+def fold(text):
+    """
+    Minúsculas, sem acento e só [a-z0-9]: "Sabão em Pó" -> "sabao em po".
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    ascii_text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", ascii_text.lower()).strip()
+
+
+def tokens(text):
+    return fold(text).split()
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ======================================================
+# ÍNDICE EM MEMÓRIA
+# ======================================================
+class ProductIndex:
+    """
+    Índice invertido de produtos (nome do produto + nome da requisição).
+
+    Cada termo da busca precisa casar com alguma palavra do produto:
+    por prefixo ("deter" -> "detergente") ou, se não houver prefixo,
+    por trigramas (erros de digitação: "detergnte"). Atualizável por
+    produto (put/discard), sem reconstruir tudo.
+    """
+
+    def __init__(self):
+        self.docs = {}                    # id -> dict do resultado
+        self.doc_words = {}               # id -> set de palavras
+        self.postings = defaultdict(set)  # palavra -> ids
+        self.grams = defaultdict(set)     # trigrama -> palavras
+        self._sorted_words = None         # cache pro prefixo (bisect)
+
+    # ---- manutenção ----
+    def put(self, doc_id, name, requisition_id, requisition_name):
+        self.discard(doc_id)
+        words = set(tokens(name)) | set(tokens(requisition_name))
+        self.docs[doc_id] = {
+            "id": doc_id,
+            "name": name,
+            "requisition_id": requisition_id,
+            "requisition_name": requisition_name,
+        }
+        self.doc_words[doc_id] = words
+        for word in words:
+            if not self.postings[word]:
+                for gram in trigrams(word):
+                    self.grams[gram].add(word)
+                self._sorted_words = None
+            self.postings[word].add(doc_id)
+
+    def discard(self, doc_id):
+        self.docs.pop(doc_id, None)
+        for word in self.doc_words.pop(doc_id, ()):
+            ids = self.postings[word]
+            ids.discard(doc_id)
+            if not ids:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                self._sorted_words = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ---- busca ----
+    def _prefix_words(self, term):
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self.postings)
+        words = self._sorted_words
+        found = []
+        i = bisect_left(words, term)
+        while i < len(words) and words[i].startswith(term):
+            found.append(words[i])
+            i += 1
+        return found
+
+    def _similar_words(self, term):
+        term_grams = trigrams(term)
+        shared = defaultdict(int)
+        for gram in term_grams:
+            for word in self.grams.get(gram, ()):
+                shared[word] += 1
+        similar = {}
+        for word, count in shared.items():
+            score = count / len(term_grams | trigrams(word))
+            if score >= TRIGRAM_THRESHOLD:
+                similar[word] = score
+        return similar
+
+    def _term_scores(self, term):
+        """
+        {doc_id: nota} dos produtos que casam com um termo.
+        """
+        scores = {}
+        prefixed = self._prefix_words(term)
+        if prefixed:
+            for word in prefixed:
+                score = 2.0 if word == term else 1.0 + len(term) / len(word)
+                for doc_id in self.postings[word]:
+                    scores[doc_id] = max(scores.get(doc_id, 0), score)
+            return scores
+
+        for word, score in self._similar_words(term).items():
+            for doc_id in self.postings[word]:
+                scores[doc_id] = max(scores.get(doc_id, 0), score)
+        return scores
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        terms = tokens(query)
+        if not terms:
+            return []
+
+        total = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if total is None:
+                total = scores
+            else:
+                total = {k: total[k] + v for k, v in scores.items() if k in total}
+            if not total:
+                return []
+
+        ranked = sorted(total.items(), key=lambda kv: (-kv[1], self.docs[kv[0]]["name"]))
+        return [self.docs[doc_id] for doc_id, _ in ranked[:limit]]
+
+
+# ======================================================
+# BACKENDS
+# ======================================================
+def _product_rows(**filters):
+    return (
+        Product.objects.filter(**filters)
+        .values_list("id", "name", "requisition_id", "requisition__name")
+    )
+
+
+class MemorySearchBackend:
+    """
+    Índice por processo, montado na primeira busca. Mudanças no catálogo
+    feitas neste processo entram incrementalmente (signals); se outro
+    worker mudou o catálogo (versão do cache diferente), reconstrói.
+
+    Com cache locmem cada worker tem a própria versão e não vê as trocas
+    dos outros: SEARCH_INDEX_TTL limita por quanto tempo o índice pode
+    ficar desatualizado nesse caso.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+
+    def _expired(self):
+        ttl = getattr(settings, "SEARCH_INDEX_TTL", 300)
+        return ttl is not None and time.monotonic() - self._built_at > ttl
+
+    def _current(self):
+        version = catalog_version()
+        with self._lock:
+            if self._index is None or self._version != version or self._expired():
+                index = ProductIndex()
+                for row in _product_rows().iterator(chunk_size=2000):
+                    index.put(*row)
+                self._index, self._version = index, version
+                self._built_at = time.monotonic()
+            return self._index
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        index = self._current()
+        with self._lock:
+            return index.search(query, limit)
+
+    def product_changed(self, product_id):
+        with self._lock:
+            if self._index is None:
+                return
+            row = _product_rows(id=product_id).first()
+            if row:
+                self._index.put(*row)
+            else:
+                self._index.discard(product_id)
+            self._version = catalog_version()
+
+    def requisition_changed(self, requisition_id):
+        with self._lock:
+            if self._index is None:
+                return
+            stale = [
+                doc_id for doc_id, doc in self._index.docs.items()
+                if doc["requisition_id"] == requisition_id
+            ]
+            for doc_id in stale:
+                self._index.discard(doc_id)
+            for row in _product_rows(requisition_id=requisition_id):
+                self._index.put(*row)
+            self._version = catalog_version()
+
+
+class TrigramSearchBackend:
+    """
+    Postgres com pg_trgm. A extensão e os índices GIN vêm da migration
+    0004 (só com este backend configurado) ou de
+    `manage.py enable_trigram_search`. Requer "django.contrib.postgres"
+    em INSTALLED_APPS.
+    """
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models import Q
+        from django.db.models.functions import Greatest
+
+        query = (query or "").strip()
+        if not query:
+            return []
+
+        rows = (
+            Product.objects
+            .filter(
+                Q(name__trigram_word_similar=query)
+                | Q(requisition__name__trigram_word_similar=query)
+                | Q(name__icontains=query)
+            )
+            .annotate(score=Greatest(
+                TrigramWordSimilarity(query, "name"),
+                TrigramWordSimilarity(query, "requisition__name"),
+            ))
+            .order_by("-score", "name")
+            .values("id", "name", "requisition_id", "requisition__name")[:limit]
+        )
+        return [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "requisition_id": row["requisition_id"],
+                "requisition_name": row["requisition__name"],
+            }
+            for row in rows
+        ]
+
+    def product_changed(self, product_id):
+        pass  # o índice do banco se atualiza sozinho
+
+    def requisition_changed(self, requisition_id):
+        pass
+
+
+# ======================================================
+# PG_TRGM (extensão + índices GIN, só pro TrigramSearchBackend)
+# ======================================================
+TRIGRAM_INDEXES = [
+    ("product_name_trgm_idx", "requisicoes_product", "name"),
+    ("requisition_name_trgm_idx", "requisicoes_requisition", "name"),
+]
+
+
+def uses_trigram_backend():
+    backend = getattr(settings, "SEARCH_BACKEND", "")
+    return backend.endswith("TrigramSearchBackend")
+
+
+def create_trigram_indexes(execute):
+    """
+    CREATE EXTENSION exige privilégio que bancos gerenciados nem sempre
+    dão: só roda quando o backend trigram foi escolhido.
+    """
+    execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ("{column}" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(execute):
+    for name, _, _ in TRIGRAM_INDEXES:
+        execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        backend = getattr(settings, "SEARCH_BACKEND", "requisicoes.search.MemorySearchBackend")
+        _backend = import_string(backend)()
+    return _backend
+
+
+def search_products(query, limit=SEARCH_LIMIT):
+    return get_search_backend().search(query, limit)
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import sys
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -12,6 +13,9 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "unsafe-secret-key")
 # DEBUG por ambiente (local: set DEBUG=1)
 DEBUG = os.environ.get("DEBUG", "0") == "1"
 
+# manage.py test
+TESTING = sys.argv[1:2] == ["test"]
+
 # Render hostname (quando existir)
 RENDER_EXTERNAL_HOSTNAME = os.environ.get("RENDER_EXTERNAL_HOSTNAME")
 
@@ -95,11 +99,16 @@ WSGI_APPLICATION = "requisicoes.wsgi.application"
 # ===============================
 DATABASE_URL = os.environ.get("DATABASE_URL")
 
+# wsgi (gunicorn sync) ou asgi (gunicorn + uvicorn worker) — ver entrypoint.sh.
+# Em ASGI conexão persistente não é reaproveitada entre requests async:
+# conn_max_age=0 e, se precisar, pool do lado do banco (pgbouncer).
+SERVER_MODE = os.environ.get("SERVER_MODE", "wsgi")
+
 if DATABASE_URL:
     DATABASES = {
         "default": dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            conn_max_age=0 if SERVER_MODE == "asgi" else 600,
             ssl_require=True,
         )
     }
@@ -108,27 +117,130 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # TEST_DB_NAME=test_db.sqlite3: banco de teste em arquivo (não
+            # :memory: compartilhado), onde escritas concorrentes esperam o
+            # lock em vez de falhar na hora (ConcurrentTransitionTest)
+            "TEST": {"NAME": os.environ.get("TEST_DB_NAME") or None},
         }
     }
 
+# busca de produtos: índice em memória (padrão, qualquer banco) ou pg_trgm
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "requisicoes.search.MemorySearchBackend")
+# índice em memória: teto (s) de desatualização quando outro worker mudou
+# o catálogo e o cache não é compartilhado (locmem)
+SEARCH_INDEX_TTL = int(os.environ.get("SEARCH_INDEX_TTL", "300"))
+if DATABASE_URL and SEARCH_BACKEND.endswith("TrigramSearchBackend"):
+    INSTALLED_APPS.append("django.contrib.postgres")
+
+# ===============================
+# CACHE
+# ===============================
+# locmem (padrão) é por processo; com vários workers use CACHE_BACKEND=file
+# pra invalidação do catálogo valer pra todos.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem")
+
+if CACHE_BACKEND == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR", str(BASE_DIR / "var" / "cache")),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "xodo",
+        }
+    }
+
+# snapshots do catálogo (requisições/produtos), em segundos
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", "300"))
+
+# badge de pedidos pendentes (contador incremental por filial destino);
+# o timeout só limita o desvio de mudanças feitas fora das views
+PENDING_COUNT_TIMEOUT = int(os.environ.get("PENDING_COUNT_TIMEOUT", "300"))
+
+# cards de pedido renderizados (chave muda com status/versão do pedido)
+ORDER_CARD_CACHE_TIMEOUT = int(os.environ.get("ORDER_CARD_CACHE_TIMEOUT", "86400"))
+
+# linhas do tempo de pedidos finalizados (não mudam mais)
+TIMELINE_CACHE_TIMEOUT = int(os.environ.get("TIMELINE_CACHE_TIMEOUT", "86400"))
+
+# PDFs de pedidos já renderizados (um arquivo por pedido/versão de status)
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", str(BASE_DIR / "var" / "pdf"))
+
+# processos usados na exportação em lote (export_picking_list); vazio = nº de CPUs
+PDF_EXPORT_WORKERS = int(os.environ["PDF_EXPORT_WORKERS"]) if os.environ.get("PDF_EXPORT_WORKERS") else None
+
+# lista de separação pela tela: renderiza no próprio worker, sem pool de
+# processos; acima disso só pelo comando
+PICKING_MAX_ORDERS = int(os.environ.get("PICKING_MAX_ORDERS", "100"))
+
+# QR codes mantidos em memória por processo (LRU)
+QR_CACHE_SIZE = int(os.environ.get("QR_CACHE_SIZE", "512"))
+
+# Eventos ao vivo do painel (SSE, só sob ASGI). LocalBroadcaster = um processo.
+ORDER_EVENTS_BACKEND = os.environ.get("ORDER_EVENTS_BACKEND", "requisicoes.events.LocalBroadcaster")
+ORDER_EVENTS_KEEPALIVE = 15
+
+# Carrinho fora da sessão: CookieCartStore (cookie assinado, padrão) ou
+# CacheCartStore (precisa de cache compartilhado entre workers)
+CART_STORE_BACKEND = os.environ.get("CART_STORE_BACKEND", "requisicoes.cart_store.CookieCartStore")
+
+# sessão no banco (tabela django_session, a mesma do cached_db: sessões
+# e carrinhos antigos continuam valendo). cached_db não ajudava: o cache
+# padrão é locmem, um por processo, e toda gravação ia ao banco do mesmo jeito.
+SESSION_ENGINE = "django.contrib.sessions.backends.db"
+
 # ===============================
 # STATIC FILES
 # ===============================
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 # ===============================
 # MEDIA — CLOUDINARY
 # ===============================
-DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
-
 CLOUDINARY_STORAGE = {
     "CLOUD_NAME": os.environ.get("CLOUDINARY_CLOUD_NAME"),
     "API_KEY": os.environ.get("CLOUDINARY_API_KEY"),
     "API_SECRET": os.environ.get("CLOUDINARY_API_SECRET"),
 }
 
+# Django 5.1 ignora DEFAULT_FILE_STORAGE/STATICFILES_STORAGE: vale STORAGES.
+# Sem Cloudinary configurado (local/testes) a mídia fica em disco.
+MEDIA_URL = "/media/"
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", str(BASE_DIR / "var" / "media")))
+
+STORAGES = {
+    "default": {
+        "BACKEND": (
+            "cloudinary_storage.storage.MediaCloudinaryStorage"
+            if CLOUDINARY_STORAGE["CLOUD_NAME"]
+            else "django.core.files.storage.FileSystemStorage"
+        ),
+    },
+    "staticfiles": {
+        # nomes com hash + gzip/brotli, servidos com cache longo pelo whitenoise
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+# o manifest exige collectstatic antes de qualquer render: em DEBUG e nos
+# testes os estáticos saem direto das pastas static/ dos apps
+if DEBUG or TESTING:
+    STORAGES["staticfiles"]["BACKEND"] = "django.contrib.staticfiles.storage.StaticFilesStorage"
+
+# Como as URLs públicas da mídia são montadas ao salvar (requisicoes/media_urls.py).
+# PrefixURLResolver + MEDIA_URL_PREFIX monta sem falar com o storage (CDN, testes).
+MEDIA_URL_RESOLVER = os.environ.get(
+    "MEDIA_URL_RESOLVER", "requisicoes.media_urls.StorageURLResolver"
+)
+MEDIA_URL_PREFIX = os.environ.get("MEDIA_URL_PREFIX", MEDIA_URL)
+
+# miniaturas das requisições (alturas em px; 1x e 2x do card de 80px)
+THUMBNAIL_HEIGHTS = (80, 160)
+
 # ===============================
 # I18N
 # ===============================
@@ -144,6 +256,13 @@ LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login/"
 
+# ✅ carrega profile + filial junto com o usuário (1 query por request).
+# ModelBackend fica como fallback pra sessões antigas continuarem válidas.
+AUTHENTICATION_BACKENDS = [
+    "requisicoes.backends.BranchModelBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 # ===============================
 # SEGURANÇA PRODUÇÃO
 # ===============================
@@ -164,16 +283,37 @@ else:
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# ===============================
+# INSTRUMENTAÇÃO (queries por request)
+# ===============================
+PERF_INSTRUMENTATION = os.environ.get("PERF_INSTRUMENTATION", "0") == "1"
+PERF_SLOW_REQUEST_MS = int(os.environ.get("PERF_SLOW_REQUEST_MS", "500"))
+PERF_DUPLICATE_THRESHOLD = int(os.environ.get("PERF_DUPLICATE_THRESHOLD", "5"))
+PERF_RING_SIZE = int(os.environ.get("PERF_RING_SIZE", "200"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "requisicoes.perf": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
+
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "requisicoes.middleware.AsyncWhiteNoiseMiddleware",  # whitenoise, também async (ASGI)
+    "requisicoes.middleware.QueryInstrumentationMiddleware",  # só com PERF_INSTRUMENTATION=1
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
 
-    "requisicoes.middleware.EnsureUserProfileMiddleware",  # ✅ AQUI
+    "requisicoes.middleware.BranchMiddleware",  # ✅ request.branch (filial)
+    "requisicoes.middleware.CartMiddleware",  # request.cart (fora da sessão)
 
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -0,0 +1,153 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+
+from .models import Requisition
+
+
+IMAGE_FIELDS = ("icon", "image")
+THUMBNAIL_ROOT = "thumbs/"
+
+# formato -> (extensão, opções do Pillow)
+FORMATS = {
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "png": ("png", {"format": "PNG", "optimize": True}),
+}
+
+
+def _heights():
+    return tuple(getattr(settings, "THUMBNAIL_HEIGHTS", (80, 160)))
+
+
+def thumbnail_name(requisition_id, field_name, height, ext):
+    return f"{THUMBNAIL_ROOT}requisitions/{requisition_id}/{field_name}-{height}.{ext}"
+
+
+# ======================================================
+# GERAÇÃO (Pillow + storage do campo, sem banco)
+# ======================================================
+def _resize(image, height):
+    if image.height <= height:
+        return image.copy()
+    width = max(1, round(image.width * height / image.height))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, fmt):
+    ext, options = FORMATS[fmt]
+    if fmt == "png" and image.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        image = image.convert("RGBA")
+    if fmt == "webp" and image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buf = BytesIO()
+    image.save(buf, **options)
+    return ext, buf.getvalue()
+
+
+def _build_field(requisition, field_name):
+    field = getattr(requisition, field_name)
+    storage = field.storage
+
+    with field.open("rb") as fh:
+        source = Image.open(fh)
+        source.load()
+
+    variants = {fmt: {} for fmt in FORMATS}
+    for height in _heights():
+        resized = _resize(source, height)
+        for fmt in FORMATS:
+            ext, data = _encode(resized, fmt)
+            name = thumbnail_name(requisition.pk, field_name, height, ext)
+            # nome fixo por variante: apaga antes pra o storage não renomear
+            if storage.exists(name):
+                storage.delete(name)
+            variants[fmt][str(height)] = storage.save(name, ContentFile(data))
+
+    return {"source": field.name, **variants}
+
+
+def build_thumbnails(requisition, force=False):
+    """
+    Gera as miniaturas que faltam (ou estão velhas) de uma requisição.
+    Retorna o novo dict pra `thumbnails` ou None se nada mudou. Não
+    toca no banco: pode rodar em threads (backfill).
+    """
+    current = dict(requisition.thumbnails or {})
+    result = {}
+    changed = False
+
+    for field_name in IMAGE_FIELDS:
+        field = getattr(requisition, field_name)
+        entry = current.get(field_name)
+
+        if not field:
+            changed = changed or entry is not None
+            continue
+        if entry and entry.get("source") == field.name and not force:
+            result[field_name] = entry
+            continue
+
+        try:
+            result[field_name] = _build_field(requisition, field_name)
+        except (OSError, UnidentifiedImageError, ValueError):
+            # arquivo sumiu do storage ou não é imagem: fica sem miniatura
+            pass
+        changed = True
+
+    return result if changed else None
+
+
+def save_thumbnails(requisition_id, thumbnails):
+    """
+    Grava via UPDATE (não dispara post_save de novo). Quem chama troca a
+    versão do catálogo, que guarda as URLs das miniaturas.
+    """
+    Requisition.objects.filter(pk=requisition_id).update(thumbnails=thumbnails)
+
+
+def refresh_thumbnails(requisition, force=False):
+    thumbnails = build_thumbnails(requisition, force=force)
+    if thumbnails is not None:
+        save_thumbnails(requisition.pk, thumbnails)
+        requisition.thumbnails = thumbnails
+    return thumbnails
+
+
+# ======================================================
+# TEMPLATE: src/srcset
+# ======================================================
+def thumbnail_sources(thumbnails, resolver):
+    """
+    {"src": png 1x, "png": srcset, "webp": srcset} da miniatura preferida
+    (ícone, senão imagem) ou None. `resolver` é qualquer coisa com
+    .url(nome): um storage ou um resolver de requisicoes/media_urls.py.
+    """
+    for field_name in IMAGE_FIELDS:
+        entry = (thumbnails or {}).get(field_name)
+        if not entry:
+            continue
+        srcsets = {}
+        for fmt in FORMATS:
+            sizes = sorted(entry.get(fmt, {}).items(), key=lambda kv: int(kv[0]))
+            if not sizes:
+                break
+            base = int(sizes[0][0])
+            srcsets[fmt] = ", ".join(
+                f"{resolver.url(name)} {int(h) / base:g}x" for h, name in sizes
+            )
+        else:
+            first_png = sorted(entry["png"].items(), key=lambda kv: int(kv[0]))[0][1]
+            return {"src": resolver.url(first_png), **srcsets}
+    return None
+
+
+
+def thumbnail_names(thumbnails):
+    """
+    Todos os arquivos de miniatura referenciados num valor de `thumbnails`.
+    """
+    for entry in (thumbnails or {}).values():
+        for fmt in FORMATS:
+            yield from entry.get(fmt, {}).values()
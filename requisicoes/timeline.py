@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import Lag, Lead
+from django.utils import timezone
+
+from .models import Order, OrderStatusHistory
+from .perf import record_fragments
+
+
+S = Order.Status
+
+# depois daqui a linha do tempo não muda mais: pode ficar em cache
+TERMINAL_STATUSES = (S.RECEBIDO_ORIGEM,)
+
+_LABELS = dict(S.choices)
+
+
+def _timeout():
+    return getattr(settings, "TIMELINE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def format_duration(seconds):
+    """
+    3725 -> "1h 02min"; 90000 -> "1d 01h".
+    """
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 60 * 24)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours:02d}h"
+    if hours:
+        return f"{hours}h {minutes:02d}min"
+    return f"{minutes}min"
+
+
+# ======================================================
+# UMA QUERY PRA PÁGINA INTEIRA (LAG/LEAD por pedido)
+# ======================================================
+def history_rows(order_ids):
+    """
+    Histórico dos pedidos com o status anterior (LAG) e o momento da
+    próxima troca (LEAD), calculados no banco por pedido.
+    """
+    window = {
+        "partition_by": [F("order_id")],
+        "order_by": [F("changed_at").asc(), F("id").asc()],
+    }
+    return (
+        OrderStatusHistory.objects
+        .filter(order_id__in=order_ids)
+        .annotate(
+            from_status=Window(Lag("status"), **window),
+            left_at=Window(Lead("changed_at"), **window),
+        )
+        .order_by("order_id", "changed_at", "id")
+        .values("order_id", "status", "from_status", "changed_at", "left_at", "changed_by__username")
+    )
+
+
+def _timeline(order, rows, now):
+    steps = []
+    totals = {}
+    for row in rows:
+        left_at = row["left_at"]
+        seconds = int(((left_at or now) - row["changed_at"]).total_seconds())
+        # status final não "gasta" tempo: o pedido acabou
+        if left_at is None and row["status"] in TERMINAL_STATUSES:
+            seconds = 0
+        steps.append({
+            "status": row["status"],
+            "label": _LABELS.get(row["status"], row["status"]),
+            "from_status": row["from_status"],
+            "entered_at": row["changed_at"],
+            "left_at": left_at,
+            "seconds": seconds,
+            "duration": format_duration(seconds),
+            "open": left_at is None and row["status"] not in TERMINAL_STATUSES,
+            "changed_by": row["changed_by__username"],
+        })
+        totals[row["status"]] = totals.get(row["status"], 0) + seconds
+
+    lead_seconds = None
+    if steps and order.status in TERMINAL_STATUSES:
+        lead_seconds = int((steps[-1]["entered_at"] - steps[0]["entered_at"]).total_seconds())
+
+    return {
+        "order": order.id,
+        "status": order.status,
+        "steps": steps,
+        # tempo em cada status, na ordem do fluxo
+        "durations": [
+            {"status": value, "label": label, "seconds": totals[value],
+             "duration": format_duration(totals[value])}
+            for value, label in S.choices if value in totals
+        ],
+        "lead_seconds": lead_seconds,
+        "lead_time": format_duration(lead_seconds) if lead_seconds is not None else "",
+    }
+
+
+def build_timelines(orders, now=None):
+    """
+    {order_id: linha do tempo} — uma query, qualquer número de pedidos.
+    """
+    now = now or timezone.now()
+    grouped = {order.id: [] for order in orders}
+    for row in history_rows(list(grouped)):
+        grouped[row["order_id"]].append(row)
+    return {order.id: _timeline(order, grouped[order.id], now) for order in orders}
+
+
+# ======================================================
+# CACHE (só pedidos finalizados)
+# ======================================================
+def timeline_key(order):
+    return f"timeline:{order.id}:{order.version}"
+
+
+def order_timelines(orders):
+    """
+    Linhas do tempo da página, na ordem de `orders`. Finalizados vêm do
+    cache (get_many); o resto sai de build_timelines numa query só.
+    """
+    orders = list(orders)
+    finished = [o for o in orders if o.status in TERMINAL_STATUSES]
+    cached = cache.get_many([timeline_key(o) for o in finished]) if finished else {}
+
+    result = {}
+    missing = []
+    for order in orders:
+        hit = cached.get(timeline_key(order)) if order.status in TERMINAL_STATUSES else None
+        if hit is None:
+            missing.append(order)
+        else:
+            result[order.id] = hit
+
+    to_cache = {}
+    if missing:
+        built = build_timelines(missing)
+        result.update(built)
+        to_cache = {
+            timeline_key(o): built[o.id] for o in missing if o.status in TERMINAL_STATUSES
+        }
+        if to_cache:
+            cache.set_many(to_cache, _timeout())
+
+    if finished:
+        record_fragments("timeline", len(finished) - len(to_cache), len(to_cache))
+    return [result[order.id] for order in orders]
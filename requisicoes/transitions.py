@@ -0,0 +1,199 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .events import publish_status_changed
+from .models import Order, OrderStatusHistory
+from .pdf import invalidate_order_pdfs
+from .pending import record_transition
+
+
+S = Order.Status
+
+DESTINATION = "destino"
+ORIGIN = "origem"
+
+# Fluxo de status (único lugar que define): atual -> (próximo, quem executa)
+TRANSITIONS = {
+    S.CRIADO: (S.RECEBIDO_DESTINO, DESTINATION),
+    S.RECEBIDO_DESTINO: (S.SEPARANDO, DESTINATION),
+    S.SEPARANDO: (S.ENVIADO, DESTINATION),
+    S.ENVIADO: (S.RECEBIDO_ORIGEM, ORIGIN),
+}
+
+# Passos que a filial destino (Austin) executa: novo status -> status exigido
+DESTINATION_STEPS = {
+    target: current
+    for current, (target, actor) in TRANSITIONS.items()
+    if actor == DESTINATION
+}
+
+
+class TransitionError(Exception):
+    """
+    Transição pedida não existe no fluxo de status.
+    """
+
+
+class TransitionConflict(TransitionError):
+    """
+    O pedido mudou de status entre a leitura e a escrita (outro usuário
+    chegou antes). `current` é o status que está no banco agora.
+    """
+
+    def __init__(self, order_id, expected, current):
+        self.order_id = order_id
+        self.expected = expected
+        self.current = current
+        label = S(current).label if current in S.values else current
+        super().__init__(
+            f"Pedido #{order_id} já foi atualizado por outra pessoa (agora: {label})."
+        )
+
+
+def next_status(status, actor):
+    """
+    Próximo status que `actor` pode aplicar a partir de `status` (ou None).
+    """
+    target, who = TRANSITIONS.get(status, (None, None))
+    return target if who == actor else None
+
+
+# ======================================================
+# TRANSIÇÃO DE UM PEDIDO (compare-and-set)
+# ======================================================
+@transaction.atomic
+def transition(order, target, user):
+    """
+    Move `order` pra `target` se, no banco, ele ainda estiver no status
+    lido (order.status). O UPDATE é condicional e só grava status,
+    status_changed_at e version — dois cliques simultâneos não geram dois históricos:
+    o segundo recebe TransitionConflict.
+    """
+    expected = order.status
+    allowed, _ = TRANSITIONS.get(expected, (None, None))
+    if allowed != target:
+        raise TransitionError(f"Transição inválida: {expected} -> {target}")
+
+    now = timezone.now()
+    updated = Order.objects.filter(pk=order.pk, status=expected).update(
+        status=target, status_changed_at=now, version=F("version") + 1
+    )
+    if not updated:
+        current = Order.objects.filter(pk=order.pk).values_list("status", flat=True).first()
+        raise TransitionConflict(order.pk, expected, current)
+
+    order.status = target
+    order.status_changed_at = now
+    order.version += 1
+
+    # create dispara o post_save (invalida o PDF em cache)
+    OrderStatusHistory.objects.create(order=order, status=target, changed_by=user)
+    record_transition(order.destination_location_id, expected, target)
+    publish_status_changed(order)
+    return order
+
+
+def advance(order, user, actor):
+    """
+    Próximo passo do fluxo pra quem está agindo (destino ou origem).
+    """
+    target = next_status(order.status, actor)
+    if target is None:
+        raise TransitionError(
+            f"Pedido #{order.pk} não pode avançar a partir de {order.get_status_display()}."
+        )
+    return transition(order, target, user)
+
+
+@dataclass
+class BulkResult:
+    target: str
+    updated: list = field(default_factory=list)
+    skipped: dict = field(default_factory=dict)  # {order_id: motivo}
+
+    def as_dict(self):
+        return {
+            "target": self.target,
+            "updated": self.updated,
+            "skipped": [{"id": pk, "reason": reason} for pk, reason in self.skipped.items()],
+        }
+
+
+# ======================================================
+# AVANÇO EM LOTE (filial destino)
+# ======================================================
+@transaction.atomic
+def bulk_advance(order_ids, target, user, destination_location_id):
+    """
+    Move vários pedidos da filial destino pra `target` de uma vez.
+
+    Uma query trava e valida todos, um UPDATE condicional (status ainda
+    é o esperado) aplica, e o histórico entra num bulk_create. Pedidos
+    inexistentes, de outra filial ou fora do status esperado são pulados
+    e reportados.
+    """
+    if target not in DESTINATION_STEPS:
+        raise TransitionError(f"Transição inválida: {target}")
+    expected = DESTINATION_STEPS[target]
+
+    ids = list(dict.fromkeys(order_ids))
+    result = BulkResult(target=target)
+    if not ids:
+        return result
+
+    orders = {
+        order.id: order
+        for order in Order.objects.select_for_update()
+        .filter(id__in=ids, destination_location_id=destination_location_id)
+        .only("id", "status", "origin_location_id", "destination_location_id")
+    }
+
+    eligible = []
+    for pk in ids:
+        order = orders.get(pk)
+        if order is None:
+            result.skipped[pk] = "não encontrado"
+        elif order.status != expected:
+            result.skipped[pk] = f"status atual: {order.get_status_display()}"
+        else:
+            eligible.append(order)
+
+    if not eligible:
+        return result
+
+    now = timezone.now()
+    eligible_ids = [o.id for o in eligible]
+    moved = Order.objects.filter(id__in=eligible_ids, status=expected).update(
+        status=target, status_changed_at=now, version=F("version") + 1
+    )
+    if moved != len(eligible):
+        # select_for_update não trava no SQLite: alguém avançou parte deles
+        # entre a leitura e o UPDATE. status_changed_at=now marca os nossos.
+        ours = set(
+            Order.objects.filter(id__in=eligible_ids, status=target, status_changed_at=now)
+            .values_list("id", flat=True)
+        )
+        for order in eligible:
+            if order.id not in ours:
+                result.skipped[order.id] = "atualizado por outra pessoa"
+        eligible = [o for o in eligible if o.id in ours]
+        if not eligible:
+            return result
+
+    OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(order_id=o.id, status=target, changed_by=user)
+        for o in eligible
+    ])
+
+    # bulk_create não dispara post_save: invalidações/eventos aqui mesmo
+    record_transition(destination_location_id, expected, target, count=len(eligible))
+    invalidate_order_pdfs([o.id for o in eligible])
+    for order in eligible:
+        order.status = target
+        publish_status_changed(order)
+        result.updated.append(order.id)
+
+    return result
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from . import views
@@ -16,15 +18,21 @@ urlpatterns = [
     # QUEIMADOS
     path("requisicoes/", views.requisition_list, name="requisition_list"),
     path("requisition/<int:id>/", views.requisition_detail, name="requisition_detail"),
+    path("busca/", views.product_search, name="product_search"),
 
     # CARRINHO
     path("lista/", views.cart_view, name="cart_view"),
     path("lista/add/<int:product_id>/", views.cart_add, name="cart_add"),
     path("lista/update/<int:product_id>/", views.cart_update, name="cart_update"),
     path("lista/remove/<int:product_id>/", views.cart_remove, name="cart_remove"),
+    path("lista/lote/", views.cart_batch, name="cart_batch"),
     path("lista/enviar/", views.cart_submit, name="cart_submit"),
     path("pedido-enviado/", views.order_sent, name="order_sent"),
 
+    # PEDIDO (PRÉ-VISUALIZAÇÃO / QR)
+    path("pedido/<int:id>/", views.order_preview, name="order_preview"),
+    path("pedido/<int:id>/qr.png", views.order_qr, name="order_qr"),
+
     # MEUS PEDIDOS / CONFIRMAR
     path("meus-pedidos/", views.user_orders, name="user_orders"),
     path("confirmar-recebimento/<int:id>/", views.confirmar_recebimento, name="confirmar_recebimento"),
@@ -32,7 +40,18 @@ urlpatterns = [
     # AUSTIN (ADMIN XODÓ)
     path("xodo-admin/", views.admin_home, name="admin_home"),
     path("xodo-admin/avancar/<int:id>/", views.advance_status, name="advance_status"),
+    path("xodo-admin/avancar-lote/", views.bulk_advance_status, name="bulk_advance_status"),
+    path("xodo-admin/eventos/", views.order_events, name="order_events"),
+    path("xodo-admin/pedidos/<int:id>/card/", views.order_card, name="order_card"),
+    path("xodo-admin/pedidos/<int:id>/pdf/", views.order_pdf, name="generate_pdf"),
+    path("xodo-admin/separacao/pdf/", views.picking_list_pdf, name="picking_list_pdf"),
+    path("xodo-admin/perf/", views.perf_dashboard, name="perf_dashboard"),
+    path("xodo-admin/dashboard/", views.dashboard, name="dashboard"),
+    path("pedidos/linha-do-tempo/", views.order_timeline, name="order_timeline"),
 
     # DJANGO ADMIN
     path("admin/", admin.site.urls),
 ]
+
+# storage local (sem Cloudinary): arquivos e miniaturas servidos em DEBUG
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
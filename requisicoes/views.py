@@ -1,34 +1,72 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden
+from django.contrib.auth.decorators import login_required, user_passes_test
+import json
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Q
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.shortcuts import redirect
 
 from .models import (
     Order,
-    OrderItem,
-    OrderStatusHistory,
     Location,
-    Product,
-    Requisition,
     UserProfile,
 )
+from . import catalog
+from .branch import AUSTIN, abranch, branch_for_user
+from .cart import CartError, load_cart_items, submit_cart
+from .cart_store import CartFull, apply_batch, cart_summary
+from .events import (
+    format_sse,
+    get_broadcaster,
+    location_channel,
+    publish_order_created,
+)
+from .fragments import with_csrf
+from .orders import (
+    ADMIN_CARD,
+    SORT_CHOICES,
+    USER_CARD,
+    order_detail_queryset,
+    aorder_page_for_request,
+    order_cards,
+    order_listing_queryset,
+    order_page_for_request,
+)
+from .perf import fragment_stats, recent_requests
+from .qrcodes import qr_base64, qr_png
+from .rollups import dashboard_data
+from .pdf import cached_order_pdf, stamp_token
+from .picking import build_picking_pdf, select_orders
+from .search import search_products
+from .timeline import order_timelines
+from .transitions import (
+    DESTINATION,
+    DESTINATION_STEPS,
+    TransitionConflict,
+    TransitionError,
+    advance,
+    bulk_advance,
+    transition,
+)
 
 
 # ======================================================
 # HELPERS
 # ======================================================
-def _get_location_name(request):
-    try:
-        # pode existir profile sem location (null)
-        if hasattr(request.user, "profile") and request.user.profile.location:
-            return request.user.profile.location.name
-        return None
-    except Exception:
-        return None
-
-
 def _ensure_profile(request):
     """
     Garante que o usuário tenha UserProfile (mesmo sem filial).
@@ -38,31 +76,50 @@ def _ensure_profile(request):
 
 
 def _has_location(request):
-    return _get_location_name(request) is not None
+    return request.branch.has_location
 
 
 def _is_queimados(request):
-    return _get_location_name(request) == "Queimados"
+    return request.branch.is_queimados
 
 
 def _is_austin(request):
-    return _get_location_name(request) == "Austin"
-
+    return request.branch.is_austin
 
 
+def _require_location_or_setup(request):
+    """
+    Sem filial definida -> manda pro /setup/ escolher.
+    """
+    if not _has_location(request):
+        return redirect("setup_location")
+    return None
 
-def _require_location(request):
-    try:
-        loc = request.user.profile.location
-    except Exception:
-        loc = None
 
-    if not loc:
-        messages.error(request, "Seu usuário está sem filial. Entre no /admin/ e configure o UserProfile.")
-        return redirect("logout")  # desloga e volta pro login
+async def _aqueimados_only(request):
+    """
+    Versão async de _require_location_or_setup + checagem de Queimados
+    (resolve request.branch sem query síncrona). None = pode seguir.
+    """
+    branch = await abranch(request)
+    if not branch.has_location:
+        return redirect("setup_location")
+    if branch.is_austin:
+        return redirect("admin_home")
+    if not branch.is_queimados:
+        return HttpResponseForbidden("Acesso restrito.")
     return None
 
 
+def _live_updates():
+    # SSE do painel só faz sentido com workers ASGI (ver order_events)
+    return settings.SERVER_MODE == "asgi"
+
+
+async def _arender(request, template, context):
+    # context processors ainda podem consultar o banco (sync)
+    return await sync_to_async(render)(request, template, context)
+
 
 # ======================================================
 # LOGIN / LOGOUT
@@ -77,12 +134,14 @@ def login_view(request):
         if user:
             login(request, user)
 
+            branch = branch_for_user(user)
+
             # ✅ se não tem profile/filial, vai pro setup
-            if not hasattr(user, "profile") or not user.profile.location:
+            if not branch.has_location:
                 return redirect("setup_location")
 
             # ✅ redireciona por filial
-            if user.profile.location.name == "Austin":
+            if branch.is_austin:
                 return redirect("admin_home")
             return redirect("requisition_list")
 
@@ -119,7 +178,7 @@ def setup_location(request):
         request.user.profile.save()
 
         # redireciona por filial
-        if loc.name == "Austin":
+        if loc.name == AUSTIN:
             return redirect("admin_home")
         return redirect("requisition_list")
 
@@ -145,23 +204,40 @@ def home(request):
 # QUEIMADOS — REQUISIÇÕES (como era antes)
 # ======================================================
 @login_required
-def requisition_list(request):
-    err = _require_location_or_setup(request)
+async def requisition_list(request):
+    err = await _aqueimados_only(request)
     if err:
         return err
 
-    if _is_austin(request):
-        return redirect("admin_home")
+    html = await catalog.arequisition_list_fragment()
+    return await _arender(request, "user/requisition_list.html", {
+        "catalog_html": with_csrf(html, request),
+    })
 
-    if not _is_queimados(request):
-        return HttpResponseForbidden("Acesso restrito.")
 
-    requisitions = Requisition.objects.all().order_by("name")
-    return render(request, "user/requisition_list.html", {"requisitions": requisitions})
+@login_required
+async def requisition_detail(request, id):
+    err = await _aqueimados_only(request)
+    if err:
+        return err
+
+    detail = await catalog.arequisition_detail_fragment(id)
+    if detail is None:
+        raise Http404("Requisição não encontrada.")
+
+    requisition, products_html = detail
+    return await _arender(request, "user/requisition_detail.html", {
+        "requisition": requisition,
+        "products_html": with_csrf(products_html, request),
+    })
 
 
 @login_required
-def requisition_detail(request, id):
+def product_search(request):
+    """
+    Busca de produtos em todas as requisições (?q=). Página com os
+    resultados ou, com Accept: application/json, só o JSON.
+    """
     err = _require_location_or_setup(request)
     if err:
         return err
@@ -172,13 +248,13 @@ def requisition_detail(request, id):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    requisition = get_object_or_404(Requisition, id=id)
-    products = requisition.products.all().order_by("name")
+    query = request.GET.get("q", "").strip()
+    results = search_products(query) if query else []
 
-    return render(request, "user/requisition_detail.html", {
-        "requisition": requisition,
-        "products": products
-    })
+    if "application/json" in request.headers.get("Accept", ""):
+        return JsonResponse({"query": query, "results": results})
+
+    return render(request, "user/product_search.html", {"query": query, "results": results})
 
 
 # ======================================================
@@ -196,15 +272,7 @@ def cart_view(request):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    cart = request.session.get("cart", {})
-    items = []
-
-    for pid_str, qty in cart.items():
-        try:
-            product = Product.objects.get(id=int(pid_str))
-            items.append({"product": product, "quantity": int(qty)})
-        except (Product.DoesNotExist, ValueError, TypeError):
-            continue
+    items = load_cart_items(request.cart.as_dict())
 
     return render(request, "user/cart.html", {"items": items})
 
@@ -229,10 +297,10 @@ def cart_add(request, product_id):
     if qty <= 0:
         return redirect("cart_view")
 
-    cart = request.session.get("cart", {})
-    key = str(product_id)
-    cart[key] = int(cart.get(key, 0)) + qty
-    request.session["cart"] = cart
+    try:
+        request.cart.add(product_id, qty)
+    except CartFull as exc:
+        messages.warning(request, str(exc))
     return redirect("cart_view")
 
 
@@ -248,19 +316,16 @@ def cart_update(request, product_id):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    cart = request.session.get("cart", {})
     try:
         qty = int(request.POST.get("quantity", 0))
     except ValueError:
         qty = 0
 
-    key = str(product_id)
-    if qty <= 0:
-        cart.pop(key, None)
-    else:
-        cart[key] = qty
-
-    request.session["cart"] = cart
+    # quantidade <= 0 remove a linha
+    try:
+        request.cart.set(product_id, qty)
+    except CartFull as exc:
+        messages.warning(request, str(exc))
     return redirect("cart_view")
 
 
@@ -276,12 +341,42 @@ def cart_remove(request, product_id):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    cart = request.session.get("cart", {})
-    cart.pop(str(product_id), None)
-    request.session["cart"] = cart
+    request.cart.remove(product_id)
     return redirect("cart_view")
 
 
+@login_required
+def cart_batch(request):
+    """
+    Várias alterações no carrinho num POST JSON, sem redirect nem
+    re-render: {"ops": [{"op": "add", "product": 12, "quantity": 3}, ...]}.
+    Os forms de cart_add/update/remove continuam valendo sem JS.
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    if _is_austin(request):
+        return redirect("admin_home")
+
+    if not _is_queimados(request):
+        return HttpResponseForbidden("Acesso restrito.")
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Use POST."}, status=405)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        ops = payload["ops"]
+        if not isinstance(ops, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": 'JSON inválido: esperado {"ops": [...]}.'}, status=400)
+
+    touched, errors = apply_batch(request.cart, ops)
+    return JsonResponse({**cart_summary(request.cart, touched), "errors": errors})
+
+
 @login_required
 def cart_submit(request):
     err = _require_location_or_setup(request)
@@ -294,42 +389,36 @@ def cart_submit(request):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    cart = request.session.get("cart", {})
+    cart = request.cart.as_dict()
     if not cart:
         messages.error(request, "Carrinho vazio.")
         return redirect("cart_view")
 
-    destino = Location.objects.filter(name="Austin").first()
+    destino = Location.objects.filter(name=AUSTIN).first()
     if not destino:
         messages.error(request, "Filial destino (Austin) não existe. Crie no /admin/ > Location.")
         return redirect("cart_view")
 
-    order = Order.objects.create(
-        created_by=request.user,
-        origin_location=request.user.profile.location,
-        destination_location=destino,
-        status=Order.Status.CRIADO,
-    )
-
-    OrderStatusHistory.objects.create(
-        order=order,
-        status=order.status,
-        changed_by=request.user
-    )
-
-    for pid_str, qty in cart.items():
-        try:
-            pid = int(pid_str)
-            q = int(qty)
-        except (ValueError, TypeError):
-            continue
-
-        if q <= 0:
-            continue
-
-        OrderItem.objects.create(order=order, product_id=pid, quantity=q)
+    try:
+        order, dropped = submit_cart(
+            cart,
+            user=request.user,
+            origin_location_id=request.branch.location_id,
+            destination_location_id=destino.id,
+        )
+    except CartError as exc:
+        # carrinho fica: o usuário vê o erro e decide o que remover
+        messages.error(request, str(exc))
+        return redirect("cart_view")
 
-    request.session["cart"] = {}
+    if dropped:
+        messages.warning(
+            request,
+            "Produtos não encontrados ficaram fora do pedido (ids: %s)."
+            % ", ".join(map(str, dropped)),
+        )
+    publish_order_created(order)
+    request.cart.clear()
     return redirect("order_sent")
 
 
@@ -346,22 +435,23 @@ def order_sent(request):
 
 
 @login_required
-def user_orders(request):
-    err = _require_location_or_setup(request)
+async def user_orders(request):
+    err = await _aqueimados_only(request)
     if err:
         return err
 
-    if _is_austin(request):
-        return redirect("admin_home")
-
-    if not _is_queimados(request):
-        return HttpResponseForbidden("Acesso restrito.")
-
-    orders = Order.objects.filter(
-        origin_location=request.user.profile.location
-    ).order_by("-created_at")
-
-    return render(request, "user/user_orders.html", {"orders": orders})
+    page = await aorder_page_for_request(
+        request, with_items=False, origin_location_id=request.branch.location_id
+    )
+    cards = await sync_to_async(order_cards)(USER_CARD, page.orders)
+
+    return await _arender(request, "user/user_orders.html", {
+        "orders": page.orders,
+        "cards_html": with_csrf(cards, request),
+        "page": page,
+        "status_choices": Order.Status.choices,
+        "sort_choices": SORT_CHOICES,
+    })
 
 
 # ======================================================
@@ -379,20 +469,17 @@ def confirmar_recebimento(request, id):
     if not _is_queimados(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    order = get_object_or_404(Order, id=id, origin_location=request.user.profile.location)
+    order = get_object_or_404(Order, id=id, origin_location_id=request.branch.location_id)
 
     if order.status != Order.Status.ENVIADO:
         messages.error(request, "Este pedido ainda não foi marcado como ENVIADO pela filial destino.")
         return redirect("user_orders")
 
-    order.status = Order.Status.RECEBIDO_ORIGEM
-    order.save()
-
-    OrderStatusHistory.objects.create(
-        order=order,
-        status=order.status,
-        changed_by=request.user
-    )
+    try:
+        transition(order, Order.Status.RECEBIDO_ORIGEM, request.user)
+    except TransitionError as exc:
+        messages.error(request, str(exc))
+        return redirect("user_orders")
 
     messages.success(request, f"Pedido #{order.id} confirmado como recebido em Queimados.")
     return redirect("user_orders")
@@ -402,7 +489,35 @@ def confirmar_recebimento(request, id):
 # AUSTIN — ADMIN XODÓ
 # ======================================================
 @login_required
-def admin_home(request):
+async def admin_home(request):
+    branch = await abranch(request)
+    if not branch.has_location:
+        return redirect("setup_location")
+
+    if not branch.is_austin:
+        return HttpResponseForbidden("Acesso restrito.")
+
+    page = await aorder_page_for_request(
+        request, with_items=False, destination_location_id=branch.location_id
+    )
+    cards = await sync_to_async(order_cards)(ADMIN_CARD, page.orders)
+
+    return await _arender(request, "admin/orders.html", {
+        "orders": page.orders,
+        "cards_html": with_csrf(cards, request),
+        "page": page,
+        "status_choices": Order.Status.choices,
+        "sort_choices": SORT_CHOICES,
+        "bulk_targets": [(s.value, s.label) for s in DESTINATION_STEPS],
+        "live_updates": _live_updates(),
+    })
+
+
+@login_required
+def order_card(request, id):
+    """
+    Card de um pedido do painel (o JS do SSE usa pra atualizar só ele).
+    """
     err = _require_location_or_setup(request)
     if err:
         return err
@@ -410,11 +525,42 @@ def admin_home(request):
     if not _is_austin(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    orders = Order.objects.filter(
-        destination_location=request.user.profile.location
-    ).order_by("-created_at")
+    order = get_object_or_404(
+        order_listing_queryset(with_items=False, destination_location_id=request.branch.location_id),
+        id=id,
+    )
+    return HttpResponse(with_csrf(order_cards(ADMIN_CARD, [order]), request))
 
-    return render(request, "admin/orders.html", {"orders": orders})
+
+async def order_events(request):
+    """
+    Server-Sent Events do painel: pedido criado / status alterado na
+    filial do usuário. Só com SERVER_MODE=asgi: sob WSGI o Django consome
+    o gerador inteiro antes de responder e o worker fica preso pra sempre,
+    então responde 204 (o EventSource não reconecta depois de um 204).
+    """
+    if not _live_updates():
+        return HttpResponse(status=204)
+
+    branch = await abranch(request)
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+
+    if not branch.has_location:
+        return HttpResponseForbidden("Acesso restrito.")
+
+    channel = location_channel(branch.location_id)
+    keepalive = getattr(settings, "ORDER_EVENTS_KEEPALIVE", 15)
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        async for event in get_broadcaster().subscribe(channel, keepalive=keepalive):
+            yield format_sse(event) if event else ": ping\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -426,24 +572,282 @@ def advance_status(request, id):
     if not _is_austin(request):
         return HttpResponseForbidden("Acesso restrito.")
 
-    order = get_object_or_404(Order, id=id, destination_location=request.user.profile.location)
+    order = get_object_or_404(Order, id=id, destination_location_id=request.branch.location_id)
 
     # Fluxo: CRIADO -> RECEBIDO_DESTINO -> SEPARANDO -> ENVIADO
-    if order.status == Order.Status.CRIADO:
-        order.status = Order.Status.RECEBIDO_DESTINO
-    elif order.status == Order.Status.RECEBIDO_DESTINO:
-        order.status = Order.Status.SEPARANDO
-    elif order.status == Order.Status.SEPARANDO:
-        order.status = Order.Status.ENVIADO
+    try:
+        advance(order, request.user, DESTINATION)
+    except TransitionConflict as exc:
+        messages.warning(request, str(exc))
+    except TransitionError:
+        pass
+
+    return redirect("admin_home")
+
+
+@login_required
+def bulk_advance_status(request):
+    """
+    Avança vários pedidos marcados no painel pro status escolhido.
+    Form normal -> mensagens + volta pro painel; Accept JSON -> relatório.
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    if not _is_austin(request):
+        return HttpResponseForbidden("Acesso restrito.")
+
+    if request.method != "POST":
+        return redirect("admin_home")
+
+    ids = []
+    for raw in request.POST.getlist("ids"):
+        try:
+            ids.append(int(raw))
+        except ValueError:
+            continue
+
+    wants_json = "application/json" in request.headers.get("Accept", "")
+    try:
+        result = bulk_advance(ids, request.POST.get("para", ""), request.user,
+                              request.branch.location_id)
+    except TransitionError as exc:
+        if wants_json:
+            return JsonResponse({"error": str(exc)}, status=400)
+        messages.error(request, str(exc))
+        return redirect("admin_home")
+
+    if wants_json:
+        return JsonResponse(result.as_dict())
+
+    if result.updated:
+        messages.success(
+            request,
+            f"{len(result.updated)} pedido(s) movidos para {Order.Status(result.target).label}.",
+        )
+    if result.skipped:
+        detalhes = ", ".join(f"#{pk} ({reason})" for pk, reason in result.skipped.items())
+        messages.warning(request, f"Pulados: {detalhes}")
+    return redirect("admin_home")
+
+
+@login_required
+def dashboard(request):
+    """
+    Indicadores da filial Austin (vazão por dia, lead time, produtos mais
+    pedidos). Lê só os rollups: atualizar com `manage.py update_rollups`.
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    if not _is_austin(request):
+        return HttpResponseForbidden("Acesso restrito.")
+
+    try:
+        days = min(max(int(request.GET.get("dias", 30)), 1), 365)
+    except ValueError:
+        days = 30
+
+    return render(request, "admin/dashboard.html", dashboard_data(request.branch.location_id, days))
+
+
+# ======================================================
+# LINHA DO TEMPO DOS PEDIDOS (Austin e a filial de origem)
+# ======================================================
+@login_required
+def order_timeline(request):
+    """
+    Tempo em cada status dos pedidos da página (mesmos ?cursor=, ?status=
+    e ?ordem= das listagens). Histórico de todos numa query só; com
+    Accept: application/json, só o JSON.
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    location_id = request.branch.location_id
+    if _is_austin(request):
+        filters = {"destination_location_id": location_id}
+    elif _is_queimados(request):
+        filters = {"origin_location_id": location_id}
     else:
+        return HttpResponseForbidden("Acesso restrito.")
+
+    page = order_page_for_request(request, with_items=False, **filters)
+    timelines = order_timelines(page.orders)
+
+    if "application/json" in request.headers.get("Accept", ""):
+        return JsonResponse({
+            "orders": timelines,
+            "next_cursor": page.next_cursor,
+        })
+
+    return render(request, "user/order_timeline.html", {
+        "rows": list(zip(page.orders, timelines)),
+        "page": page,
+        "status_choices": Order.Status.choices,
+        "sort_choices": SORT_CHOICES,
+        "back_url": "admin_home" if _is_austin(request) else "user_orders",
+    })
+
+
+# ======================================================
+# PDF DO PEDIDO (Austin e a filial de origem)
+# ======================================================
+@login_required
+def order_pdf(request, id):
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    location_id = request.branch.location_id
+    row = (
+        Order.objects.filter(id=id)
+        .filter(Q(origin_location_id=location_id) | Q(destination_location_id=location_id))
+        .annotate(stamp=Max("status_history__changed_at"))
+        .values_list("created_at", "stamp", "version")
+        .first()
+    )
+    if row is None:
+        raise Http404("Pedido não encontrado.")
+
+    created_at, stamp, version = row
+    stamp = stamp or created_at
+    etag = f'"pedido-{id}-{stamp_token(stamp, version)}"'
+    last_modified = int(stamp.timestamp())
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    response = FileResponse(
+        cached_order_pdf(id, stamp, version),
+        content_type="application/pdf",
+        filename=f"pedido-{id}.pdf",
+    )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def picking_list_pdf(request):
+    """
+    Lote de separação: lista consolidada + páginas de cada pedido.
+    ?status=SEPARANDO&de=AAAA-MM-DD&ate=AAAA-MM-DD
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    if not _is_austin(request):
+        return HttpResponseForbidden("Acesso restrito.")
+
+    status = request.GET.get("status") or Order.Status.SEPARANDO
+    if status not in Order.Status.values:
+        messages.error(request, "Status inválido.")
+        return redirect("admin_home")
+
+    try:
+        date_from = date.fromisoformat(request.GET["de"]) if request.GET.get("de") else None
+        date_to = date.fromisoformat(request.GET["ate"]) if request.GET.get("ate") else None
+    except ValueError:
+        messages.error(request, "Data inválida (use AAAA-MM-DD).")
+        return redirect("admin_home")
+
+    filters = {"status": status, "date_from": date_from, "date_to": date_to}
+    orders = select_orders(destination_location_id=request.branch.location_id, **filters)
+    count = orders.count()
+    if not count:
+        messages.error(request, "Nenhum pedido para separar com esses filtros.")
         return redirect("admin_home")
 
-    order.save()
+    limit = getattr(settings, "PICKING_MAX_ORDERS", 100)
+    if count > limit:
+        messages.error(
+            request,
+            f"Lote grande demais ({count} pedidos, máximo {limit}): filtre por data "
+            "ou gere pelo comando export_picking_list.",
+        )
+        return redirect("admin_home")
+
+    data, _ = build_picking_pdf(orders, filters=filters, workers=1)
+    response = HttpResponse(data, content_type="application/pdf")
+    response["Content-Disposition"] = 'inline; filename="separacao.pdf"'
+    return response
+
+
+# ======================================================
+# PRÉ-VISUALIZAÇÃO + QR CODE DO PEDIDO
+# ======================================================
+def _order_url(request, id):
+    return request.build_absolute_uri(reverse("order_preview", args=[id]))
+
+
+@login_required
+def order_preview(request, id):
+    err = _require_location_or_setup(request)
+    if err:
+        return err
 
-    OrderStatusHistory.objects.create(
-        order=order,
-        status=order.status,
-        changed_by=request.user
+    location_id = request.branch.location_id
+    order = get_object_or_404(
+        order_detail_queryset().filter(
+            Q(origin_location_id=location_id) | Q(destination_location_id=location_id)
+        ),
+        id=id,
     )
 
-    return redirect("admin_home")
+    return render(request, "user/order_preview.html", {
+        "order": order,
+        "qr_code": qr_base64(_order_url(request, id)),
+    })
+
+
+@login_required
+def order_qr(request, id):
+    """
+    PNG do QR do pedido. Só depende da URL, então pode ficar no cache
+    do navegador pra sempre. Mesmo acesso do order_preview: só as
+    filiais de origem/destino do pedido.
+    """
+    err = _require_location_or_setup(request)
+    if err:
+        return err
+
+    location_id = request.branch.location_id
+    get_object_or_404(
+        Order.objects.filter(
+            Q(origin_location_id=location_id) | Q(destination_location_id=location_id)
+        ).values("id"),
+        id=id,
+    )
+
+    response = HttpResponse(qr_png(_order_url(request, id)), content_type="image/png")
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+# ======================================================
+# PERFORMANCE (só staff)
+# ======================================================
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def perf_dashboard(request):
+    """
+    Últimos requests vistos por ESTE processo (QueryInstrumentationMiddleware).
+    """
+    entries = recent_requests()
+    if request.GET.get("ordem") == "queries":
+        entries.sort(key=lambda e: e["queries"], reverse=True)
+    elif request.GET.get("ordem") == "tempo":
+        entries.sort(key=lambda e: e["ms"], reverse=True)
+
+    return render(request, "admin/perf.html", {
+        "entries": entries,
+        "enabled": settings.PERF_INSTRUMENTATION,
+        "fragments": fragment_stats(),
+    })